@@ -1,41 +1,272 @@
+import re
+
+import numpy as np
 import psycopg2
+import psycopg2.errors
 import pandas as pd
 
+from snapshot import StationSnapshot
+from station_graph import StationGraph
+from station_views import (CANONICAL_NAME, CANONICAL_SOURCE, EXCLUDE, EXCLUDE_PATTERNS,
+                           VIEW_NAME, aggregate_sql, ensure_hub_view, has_station_ids)
+
+EXCLUDE_RE = re.compile("|".join(map(re.escape, EXCLUDE)))
+COLUMNS = ["station_name", "line_name", "location"]
+
+def _empty_hubs():
+    return pd.Series([], dtype='int64', name='line_name', index=pd.Index([], name='station_name'))
+
 class StationAnalyzer:
-    def __init__(self, db_params):
+    def __init__(self, db_params, lazy=False, chunksize=10000, df=None, snapshot_path=None,
+                 engine="pandas", use_view=True):
         self.db_params = db_params
-        self.df = self._load_data()
+        # engine="sql" なら集計（GROUP BY / HAVING）も Postgres に任せて、結果の数行だけ受け取る
+        # use_view=True ならその集計はマテリアライズドビュー（クロール後に更新）から読む
+        self.engine = engine
+        self.use_view = use_view
+        # lazy=True なら最初に全件読まず、区ごとに必要な行だけ SQL で取ってくる
+        self.lazy = lazy or engine == "sql"
+        self.chunksize = chunksize
+        # クレンジング済みの表を手元のファイルに置いておき、DB が変わっていなければそれを使う
+        self.snapshot = StationSnapshot(snapshot_path) if snapshot_path else None
+        # df を渡すと DB を読まずにそれを使う（ベンチマーク用）
+        self.df = None if self.lazy else self._load_data(df)
+        # 区ごとの駅数・ハブ駅数と、(区, 駅) → 路線数の表（eager モードでは最初に1回だけ作る）
+        self.line_counts = self.hubs = self.area_stats = None
+        self._view_ready = False
+        if not self.lazy:
+            self._build_index(self._count_lines(self.df))
 
-    def _load_data(self):
+    def _load_data(self, df=None):
+        if df is not None:
+            return self._cleanse(df)
+        if self.snapshot is None:
+            return self._cleanse(self._read_table())
+        try:
+            fingerprint = self.fingerprint()
+        except psycopg2.OperationalError as e:
+            # DB に繋がらなくても、スナップショットがあればそれで分析する
+            if not self.snapshot.exists(): raise
+            print(f"⚠️ DBに接続できないため、保存済みのスナップショットを使います: {e}")
+            return self.snapshot.load()
+        if self.snapshot.fingerprint() == fingerprint:
+            return self.snapshot.load()
+        df = self._cleanse(self._read_table())
+        self.snapshot.save(df, fingerprint)
+        return df
+
+    def _read_table(self):
         conn = psycopg2.connect(**self.db_params)
-        df = pd.read_sql("SELECT station_name, line_name, location FROM stations", conn)
-        conn.close()
-        # クレンジング処理
-        exclude = ["信号場", "貨物", "廃止", "国鉄", "下河原", "須賀"]
-        df = df[~df['station_name'].str.contains('|'.join(exclude))]
+        try:
+            if has_station_ids(conn):
+                # 表記ゆれをまとめた駅名も一緒に読む（station_names.py を実行していれば入っている）
+                df = pd.read_sql("SELECT s.station_name, s.line_name, s.location, i.canonical_name"
+                                 f" FROM {CANONICAL_SOURCE}", conn)
+            else:
+                df = pd.read_sql("SELECT station_name, line_name, location FROM stations", conn)
+        finally:
+            conn.close()
         return df
 
+    def fingerprint(self):
+        """stations が変わったかどうかの目印（行数・最終保存時刻・駅名の対応表の更新時刻・除外語）"""
+        conn = psycopg2.connect(**self.db_params)
+        try:
+            resolved = None
+            if has_station_ids(conn):
+                with conn.cursor() as cur:
+                    cur.execute("SELECT COUNT(*), MAX(resolved_at) FROM station_ids")
+                    count, resolved_at = cur.fetchone()
+                    resolved = [count, resolved_at.isoformat() if resolved_at else None]
+            with conn.cursor() as cur:
+                try:
+                    cur.execute("SELECT COUNT(*), MAX(scraped_at) FROM stations")
+                    rows, last_scraped = cur.fetchone()
+                except psycopg2.errors.UndefinedColumn:
+                    # db_writer の列追加前のテーブルなら行数だけで判断する
+                    conn.rollback()
+                    cur.execute("SELECT COUNT(*) FROM stations")
+                    rows, last_scraped = cur.fetchone()[0], None
+        finally:
+            conn.close()
+        return {"rows": rows, "last_scraped": last_scraped.isoformat() if last_scraped else None,
+                "station_ids": resolved, "exclude": EXCLUDE}
+
+    @staticmethod
+    def _cleanse(df):
+        # 文字列は種類が少ないのでカテゴリ型（整数コード + 辞書）で持つ
+        station = df['station_name'].astype('category')
+        # クレンジング処理: 除外語の判定は行ごとではなく、駅名の辞書に1回だけかける
+        names = station.cat.categories
+        excluded = np.fromiter((EXCLUDE_RE.search(name) is not None for name in names), bool, len(names))
+        codes = station.cat.codes.to_numpy()
+        # コード -1 は NULL（除外しない）
+        keep = (codes < 0) | ~excluded[codes]
+        df = df[keep]
+        if 'canonical_name' in df:
+            # 表記ゆれをまとめた駅名で数える（まとめた結果、同じ駅の同じ路線が重なったら1行にする）
+            df = df.assign(station_name=df['canonical_name'].fillna(df['station_name']))
+            return df[COLUMNS].drop_duplicates().astype('category')
+        return df[COLUMNS].astype({'line_name': 'category', 'location': 'category'}) \
+            .assign(station_name=station[keep].cat.remove_unused_categories())
+
+    @staticmethod
+    def _count_lines(df):
+        """(区, 駅名) → 路線数 を、文字列ではなくカテゴリの整数コードで groupby して数える"""
+        loc = df['location'].cat
+        st = df['station_name'].cat
+        valid = (loc.codes.to_numpy() >= 0) & (st.codes.to_numpy() >= 0)
+        lines = df['line_name'].notna().to_numpy()[valid]
+        keys = pd.DataFrame({'loc': loc.codes.to_numpy()[valid], 'st': st.codes.to_numpy()[valid], 'n': lines})
+        counts = keys.groupby(['loc', 'st'], sort=False)['n'].sum()
+        # 件数が少なくなってから文字列に戻して、区・駅名順に並べる
+        index = pd.MultiIndex.from_arrays([
+            loc.categories.take(counts.index.get_level_values('loc')).astype(object),
+            st.categories.take(counts.index.get_level_values('st')).astype(object),
+        ], names=['location', 'station_name'])
+        return pd.Series(counts.to_numpy().astype('int64'), index=index, name='line_name').sort_index()
+
+    def _build_index(self, line_counts):
+        """(区, 駅名) → 路線数 の Series から、区ごとの集計とハブ駅の表を作る"""
+        self.line_counts = line_counts
+        # 区の中では路線数の多い順（同数なら駅名順）に並べておく
+        hubs = line_counts[line_counts >= 2].sort_values(ascending=False, kind='stable')
+        self.hubs = hubs.sort_index(level=0, sort_remaining=False, kind='stable')
+        by_area = line_counts.groupby(level=0)
+        self.area_stats = pd.DataFrame({
+            'stations': by_area.size(),
+            'hubs': (line_counts >= 2).groupby(level=0).sum(),
+        })
+
+    def _line_count_source(self, conn):
+        """(location, station_name, line_count) を返す FROM 句（ビューか、その場で集計する副問い合わせ）"""
+        if self.engine == "sql" and self.use_view:
+            if not self._view_ready:
+                ensure_hub_view(conn)
+                self._view_ready = True
+            return VIEW_NAME
+        return f"({aggregate_sql(has_station_ids(conn))}) AS line_counts"
+
+    def _query_line_counts(self):
+        """全区の (区, 駅名) → 路線数 を SQL 側で集計して取ってくる（lazy / sql モードの analyze_all 用）"""
+        conn = psycopg2.connect(**self.db_params)
+        try:
+            source = self._line_count_source(conn)
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT location, station_name, line_count FROM {source}",
+                            {"patterns": EXCLUDE_PATTERNS})
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+        index = pd.MultiIndex.from_tuples([r[:2] for r in rows], names=['location', 'station_name'])
+        return pd.Series([r[2] for r in rows], index=index, name='line_name').sort_index()
+
+    def _query_area(self, area_name):
+        """除外条件と区の絞り込みを SQL 側で行い、サーバー側カーソルで少しずつ読む"""
+        patterns = EXCLUDE_PATTERNS
+        conn = psycopg2.connect(**self.db_params)
+        try:
+            # 表記ゆれの対応表があれば正規の駅名で返す（重なった行は DISTINCT で1行に）
+            if has_station_ids(conn):
+                sql = (f"SELECT DISTINCT {CANONICAL_NAME}, s.line_name, s.location FROM {CANONICAL_SOURCE}"
+                       " WHERE s.location = %s AND NOT (s.station_name LIKE ANY(%s))")
+            else:
+                sql = ("SELECT station_name, line_name, location FROM stations"
+                       " WHERE location = %s AND NOT (station_name LIKE ANY(%s))")
+            # 名前付きカーソルはサーバー側カーソルになるので、結果全体をクライアントに持ってこない
+            with conn.cursor(name="station_area") as cur:
+                cur.itersize = self.chunksize
+                cur.execute(sql, (area_name, patterns))
+                chunks = []
+                while True:
+                    rows = cur.fetchmany(self.chunksize)
+                    if not rows: break
+                    chunks.append(pd.DataFrame(rows, columns=COLUMNS))
+        finally:
+            conn.close()
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=COLUMNS)
+
+    def _query_area_hubs(self, area_name):
+        """区の駅数とハブ駅（2路線以上、路線数の多い順）を SQL の集計結果として受け取る"""
+        params = {"area": area_name, "patterns": EXCLUDE_PATTERNS}
+        conn = psycopg2.connect(**self.db_params)
+        try:
+            source = self._line_count_source(conn)
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT COUNT(*) FROM {source} WHERE location = %(area)s", params)
+                station_count = cur.fetchone()[0]
+                # 並び順は pandas と同じ（路線数の降順、同数ならコードポイント順の駅名）
+                cur.execute(f"SELECT station_name, line_count FROM {source}"
+                            " WHERE location = %(area)s AND line_count >= 2"
+                            ' ORDER BY line_count DESC, station_name COLLATE "C"', params)
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+        index = pd.Index([r[0] for r in rows], name='station_name')
+        return station_count, pd.Series([r[1] for r in rows], index=index, name='line_name', dtype='int64')
+
+    def area_summary(self, area_name):
+        """(総駅数, ハブ駅の Series) を返す。その区のデータがなければ None（表示はしない）"""
+        if self.engine == "sql":
+            station_count, hub_stations = self._query_area_hubs(area_name)
+            if station_count == 0: return None
+        elif self.lazy:
+            area_df = self._query_area(area_name)
+            if area_df.empty: return None
+            # その区のハブ駅（2路線以上）を抽出
+            hub_stations = area_df.groupby('station_name')['line_name'].count()
+            hub_stations = hub_stations[hub_stations >= 2].sort_values(ascending=False, kind='stable')
+            station_count = area_df['station_name'].nunique()
+        else:
+            # 作っておいた索引を引くだけ（DataFrame 全体は走査しない）
+            if area_name not in self.area_stats.index: return None
+            hub_stations = self._area_hubs(area_name)
+            station_count = self.area_stats.at[area_name, 'stations']
+        return int(station_count), hub_stations
+
     def analyze_area(self, area_name):
         """【重要】入力に応じて出力が動的に変化する関数"""
-        area_df = self.df[self.df['location'] == area_name]
-        
-        if area_df.empty:
+        summary = self.area_summary(area_name)
+        if summary is None:
             return f"❌ {area_name} のデータは見つかりませんでした。"
-        
-        # その区のハブ駅（2路線以上）を抽出
-        hub_stations = area_df.groupby('station_name')['line_name'].count()
-        hub_stations = hub_stations[hub_stations >= 2].sort_values(ascending=False)
-        
+        station_count, hub_stations = summary
+
         print(f"--- {area_name} の分析結果 ---")
-        print(f"総駅数: {area_df['station_name'].nunique()}")
+        print(f"総駅数: {station_count}")
         print(f"主要なハブ駅:\n{hub_stations if not hub_stations.empty else 'なし'}")
         return hub_stations
 
+    def _area_hubs(self, area_name):
+        if self.area_stats.at[area_name, 'hubs'] == 0:
+            return _empty_hubs()
+        return self.hubs.xs(area_name, level='location')
+
+    def analyze_all(self):
+        """全区の分析結果を一度に作る。{区: ハブ駅の Series} を返す"""
+        if self.line_counts is None:
+            self._build_index(self._query_line_counts())
+        # ハブ駅の表を区ごとに切り分けるだけなので、区の数だけ groupby し直すことはない
+        results = {area: group.droplevel('location') for area, group in self.hubs.groupby(level='location', sort=False)}
+        results = {area: results.get(area, _empty_hubs()) for area in self.area_stats.index}
+
+        print("--- 全区の分析結果 ---")
+        print(self.area_stats.rename(columns={'stations': '総駅数', 'hubs': 'ハブ駅数'}).to_string())
+        return results
+
+    def graph(self):
+        """駅と路線の乗り換えグラフ（最少乗り換え回数・到達範囲・中心性を調べる）"""
+        df = self.df if self.df is not None else self._cleanse(self._read_table())
+        return StationGraph(df)
+
 # --- 実行部分 ---
 if __name__ == "__main__":
     params = {"host": "localhost", "database": "dsprog2db", "user": "igarashiayaka", "password": ""}
-    analyzer = StationAnalyzer(params)
-    
+    # DB が前回から変わっていなければ手元のスナップショットから読む（DB が落ちていても分析できる）
+    analyzer = StationAnalyzer(params, snapshot_path="stations_snapshot.arrow")
+
     # ここで「入力」を変えることで「出力」が動的に変わる
-    target_area = input("分析したい区を入力してください（例：大田区）: ")
-    analyzer.analyze_area(target_area)
\ No newline at end of file
+    target_area = input("分析したい区を入力してください（例：大田区、全部なら「全区」）: ")
+    if target_area == "全区":
+        analyzer.analyze_all()
+    else:
+        analyzer.analyze_area(target_area)
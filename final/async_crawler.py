@@ -0,0 +1,199 @@
+import asyncio
+import contextlib
+import time
+from urllib.parse import urlparse
+
+import httpx
+
+from page_parser import extract_revision_id
+
+# 混雑・一時的な障害なので、待ってから取り直すステータス
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """トークンバケット方式のレート制限（rate: 毎秒の補充数, capacity: バースト上限）"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                # 足りない分がたまるまで待つ
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostRateLimiter:
+    """ホストごとにTokenBucketを持つ"""
+
+    def __init__(self, rate_per_sec, burst=None):
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self.buckets = {}
+
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate_per_sec, self.burst)
+        await self.buckets[host].acquire()
+
+
+class AsyncWikiCrawler:
+    """WikiScraperPostgres の解析処理を使い回して、カテゴリと駅ページを並列に取得する
+
+    URLは scraper.frontier（SQLite）から少しずつ取り出してキューに入れる。
+    キューには上限があるので、ワーカーが詰まると取り出しも止まる。
+    保存して visited にするところ（saving()）とチェックポイントは同時に走らないので、
+    確定したフロンティアで visited になっているページの行は必ず書き出し済みになる。
+    チェックポイントで保存に失敗したら、新しい URL は取り出さずに止める。
+    """
+
+    def __init__(self, scraper, concurrency=8, rate_per_sec=5.0, transport=None, checkpoint_every=50,
+                 retries=3, backoff=1.0):
+        self.scraper = scraper
+        self.frontier = scraper.frontier
+        self.metrics = scraper.metrics
+        self.transport = transport
+        self.concurrency = concurrency
+        self.checkpoint_every = checkpoint_every
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = HostRateLimiter(rate_per_sec)
+        self.queue = asyncio.Queue(maxsize=concurrency * 4)
+        self.in_flight = 0
+        self.done_since_checkpoint = 0
+        self.save_gate = asyncio.Condition()
+        self.saves_in_progress = 0
+        self.checkpointing = False
+        self.aborted = False
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=self.concurrency)
+        # 同期モード（requests）と同じくリダイレクトは追う
+        async with httpx.AsyncClient(headers=self.scraper.headers, timeout=10, limits=limits, follow_redirects=True,
+                                     transport=self.transport) as client:
+            workers = [asyncio.create_task(self.worker(client)) for _ in range(self.concurrency)]
+            await self.feed()
+            await self.queue.join()
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        await self.checkpoint()
+
+    async def feed(self):
+        while not self.aborted:
+            batch = self.frontier.next_batch(self.concurrency * 2)
+            for item in batch:
+                self.in_flight += 1
+                await self.queue.put(item)
+            if batch: continue
+            # 取り出すものがなく、処理中のものもなければ終わり
+            if self.in_flight == 0 and not self.frontier.has_pending():
+                return
+            await asyncio.sleep(0.05)
+
+    async def worker(self, client):
+        while True:
+            kind, url = await self.queue.get()
+            try:
+                # 止めたあとに残っている分は取りに行かない（pending のまま次回に回る）
+                if self.aborted: continue
+                if kind == "category":
+                    await self.crawl_category(client, url)
+                else:
+                    await self.scrape_detail(client, url)
+                self.done_since_checkpoint += 1
+                if self.done_since_checkpoint >= self.checkpoint_every:
+                    await self.checkpoint()
+            finally:
+                self.in_flight -= 1
+                self.queue.task_done()
+
+    @contextlib.asynccontextmanager
+    async def saving(self):
+        """行を writer に渡して visited にするまでを囲む（チェックポイントの間は待たされる）"""
+        async with self.save_gate:
+            await self.save_gate.wait_for(lambda: not self.checkpointing)
+            self.saves_in_progress += 1
+        try:
+            yield
+        finally:
+            async with self.save_gate:
+                self.saves_in_progress -= 1
+                self.save_gate.notify_all()
+
+    async def checkpoint(self):
+        self.done_since_checkpoint = 0
+        # 新しい保存を止めて、途中の保存が終わるのを待ってから書き出す
+        async with self.save_gate:
+            await self.save_gate.wait_for(lambda: not self.checkpointing)
+            self.checkpointing = True
+            await self.save_gate.wait_for(lambda: self.saves_in_progress == 0)
+        try:
+            # scraper.checkpoint() と同じ（フロンティアの SQLite はこのスレッドでしか触れない）
+            with self.metrics.stage("flush"):
+                await asyncio.to_thread(self.scraper.writer.flush)
+        except Exception as e:
+            self.scraper.rollback_checkpoint(e)
+            self.aborted = True
+        else:
+            self.scraper.commit_checkpoint()
+        finally:
+            async with self.save_gate:
+                self.checkpointing = False
+                self.save_gate.notify_all()
+
+    async def fetch(self, client, url):
+        cache = self.scraper.cache
+        entry = cache.lookup(url) if cache else None
+        if entry and cache.is_fresh(entry):
+            return cache.serve_fresh(url, entry)
+        headers = cache.conditional_headers(entry) if cache else {}
+        # trace で接続（DNS解決込み）にかかった時間を別に記録する
+        extensions = {"trace": self.metrics.httpx_trace}
+        for attempt in range(self.retries + 1):
+            await self.limiter.wait(url)
+            with self.metrics.stage("fetch"):
+                res = await client.get(url, headers=headers, extensions=extensions)
+                if res.status_code == 304 and entry is not None:
+                    return cache.handle_response(url, entry, res.status_code, res.text, res.headers)
+                if res.status_code not in RETRY_STATUS or attempt == self.retries:
+                    # エラーページを中身のないページとして visited にしないよう、2xx 以外は失敗にする
+                    res.raise_for_status()
+                    return cache.handle_response(url, entry, res.status_code, res.text, res.headers) if cache else res.text
+            # 混雑しているときは backoff 秒から倍々に待つ（Retry-After があればそれ以上）
+            delay = self.backoff * 2 ** attempt
+            retry_after = res.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            await asyncio.sleep(delay)
+
+    async def crawl_category(self, client, url):
+        try:
+            html = await self.fetch(client, url)
+            self.scraper.expand_category(url, html)
+        except Exception as e:
+            self.scraper.mark_failed(url, e)
+            print(f"      [!] カテゴリ取得失敗: {e}")
+
+    async def scrape_detail(self, client, url):
+        try:
+            html = await self.fetch(client, url)
+            rows = self.scraper.parse_detail(html)
+            # psycopg2はブロッキングなので別スレッドで保存する
+            async with self.saving():
+                await asyncio.to_thread(self.scraper.save_page, url, extract_revision_id(html), rows)
+                self.frontier.mark_visited(url)
+        except Exception as e:
+            self.scraper.mark_failed(url, e)
@@ -0,0 +1,57 @@
+import argparse
+import contextlib
+import io
+import time
+
+from analysis import EXCLUDE, StationAnalyzer
+from synth_stations import make_stations
+
+
+def baseline(df):
+    """変更前の処理: object 列のまま毎回正規表現を組み立てて、区ごとにマスクして groupby"""
+    df = df[~df['station_name'].str.contains('|'.join(EXCLUDE))]
+    results = {}
+    for area in df['location'].unique():
+        area_df = df[df['location'] == area]
+        hub_stations = area_df.groupby('station_name')['line_name'].count()
+        results[area] = hub_stations[hub_stations >= 2].sort_values(ascending=False, kind='stable')
+    return df, results
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 / 1024
+
+
+def main():
+    ap = argparse.ArgumentParser(description="StationAnalyzer の列の持ち方による時間とメモリの比較")
+    ap.add_argument("--rows", type=int, default=3_000_000)
+    ap.add_argument("--wards", type=int, default=62, help="区の数")
+    args = ap.parse_args()
+
+    print(f"合成データ作成中 ({args.rows:,}行)...")
+    # 比べたいのは object 列のままの処理なので、カテゴリ型をほどいてから渡す
+    df = make_stations(args.rows, wards=args.wards).astype(object)
+
+    (old_df, old_results), old_time = timed(baseline, df)
+    analyzer, load_time = timed(StationAnalyzer, None, df=df)
+    new_results, all_time = timed(analyzer.analyze_all)
+
+    mismatched = [a for a in old_results if not new_results[a].equals(old_results[a])]
+    print(f"\n{'':<22}{'メモリ(MB)':>12}{'時間(秒)':>12}")
+    print(f"{'object列 + 毎回正規表現':<16}{mb(old_df):>12.1f}{old_time:>12.2f}")
+    print(f"{'カテゴリ + 整数コード':<16}{mb(analyzer.df):>12.1f}{load_time + all_time:>12.2f}"
+          f"  (読み込み+索引 {load_time:.2f}秒 / 全区 {all_time:.3f}秒)")
+    print(f"区の数: {len(old_results)} / 結果の不一致: {len(mismatched)}")
+    if mismatched:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from db_writer import MemoryWriter
+from main import WikiScraperPostgres
+from replay import ReplayArchive
+
+
+def peak_rss_mb():
+    """このプロセスと子プロセス（解析プール）のうち大きい方のピークRSS（MB）"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return max(own, children) / scale
+
+
+def main():
+    ap = argparse.ArgumentParser(description="記録したアーカイブを再生してクロール全体を計測するベンチマーク")
+    ap.add_argument("archive", help="main.py --record で作った zip")
+    ap.add_argument("--mode", choices=["sync", "async", "pipeline", "api"], default="sync")
+    ap.add_argument("--latency", type=float, default=0.0, help="1リクエストごとの擬似的な遅延（秒）")
+    ap.add_argument("--parser", choices=["bs4", "lxml"], default="bs4")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--parse-workers", type=int, default=4)
+    ap.add_argument("--postgres", action="store_true", help="stations に実際に書き込む（指定しなければメモリに溜めるだけ）")
+    ap.add_argument("--json", help="結果を JSON で追記するファイル（回帰比較用）")
+    args = ap.parse_args()
+
+    archive = ReplayArchive(args.archive)
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper = WikiScraperPostgres(concurrency=args.concurrency, rate_per_sec=1e9,
+                                      frontier_path=os.path.join(tmp, "frontier.db"),
+                                      parser_backend=args.parser,
+                                      base_url=archive.base_url or "https://ja.wikipedia.org")
+        scraper.delay = 0
+        if not args.postgres:
+            scraper.writer = MemoryWriter()
+        scraper.use_replay(archive, args.latency)
+
+        start = time.perf_counter()
+        if args.mode == "api":
+            scraper.fetch_all_api()
+        elif args.mode == "pipeline":
+            scraper.fetch_all_pipeline(parse_workers=args.parse_workers)
+        elif args.mode == "async":
+            scraper.fetch_all_async()
+        else:
+            scraper.fetch_all()
+        elapsed = time.perf_counter() - start
+
+        counts = scraper.frontier.counts()
+        rows = scraper.writer.stats()["submitted"]
+    archive.close()
+
+    result = {
+        "mode": args.mode,
+        "parser": args.parser,
+        "latency": args.latency,
+        "archive_responses": len(archive),
+        "pages": counts["visited"],
+        "failed": counts["failed"],
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(counts["visited"] / elapsed, 2) if elapsed else 0,
+        "rows_per_sec": round(rows / elapsed, 2) if elapsed else 0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    print(f"\n=== {args.mode} / {args.parser} / 遅延 {args.latency}秒 ===")
+    print(f"ページ: {result['pages']}件 (失敗 {result['failed']}件)  行: {result['rows']}件  時間: {result['seconds']}秒")
+    print(f"{result['pages_per_sec']} ページ/秒  {result['rows_per_sec']} 行/秒  ピークRSS {result['peak_rss_mb']} MB")
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from snapshot import StationSnapshot
+from station_graph import UNREACHABLE, StationGraph
+
+
+def make_network(stations=1500, lines=150, stops=(8, 40), seed=0):
+    """路線ごとに駅を並べた合成ネットワーク（東京くらいの規模）"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for ln in range(lines):
+        for st in rng.choice(stations, rng.integers(*stops), replace=False):
+            rows.append((f"合成{st}駅", f"合成{ln}線"))
+    return pd.DataFrame(rows, columns=["station_name", "line_name"])
+
+
+def bfs_transfers(df, source):
+    """確認用: 駅と路線を交互にたどる素朴な BFS（乗り換え回数 = 乗った路線数 - 1）"""
+    lines_of = df.groupby("station_name")["line_name"].apply(set).to_dict()
+    stations_of = df.groupby("line_name")["station_name"].apply(set).to_dict()
+    dist = {source: 0}
+    line_dist = {ln: 0 for ln in lines_of[source]}
+    queue = deque(lines_of[source])
+    while queue:
+        ln = queue.popleft()
+        for st in stations_of[ln]:
+            dist.setdefault(st, line_dist[ln])
+            for nxt in lines_of[st]:
+                if nxt not in line_dist:
+                    line_dist[nxt] = line_dist[ln] + 1
+                    queue.append(nxt)
+    return dist
+
+
+def check_shared_stations(shared=300):
+    """共通の駅が多い路線どうしも乗り換えでつながるか（int8 の積だと 256 駅で 0 に戻って切れていた）"""
+    rows = [(f"共通{i}駅", ln) for i in range(shared) for ln in ("A線", "B線")]
+    rows += [("A端駅", "A線"), ("B端駅", "B線")]
+    graph = StationGraph(pd.DataFrame(rows, columns=["station_name", "line_name"]))
+    got = graph.transfers("A端駅", "B端駅")
+    print(f"共通駅 {shared}駅の路線どうしの乗り換え: {got}回")
+    if got != 1:
+        raise SystemExit(1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="駅・路線グラフの全駅間乗り換え回数のベンチマーク")
+    ap.add_argument("--snapshot", help="analysis.py が作るスナップショット（指定しなければ合成データ）")
+    ap.add_argument("--stations", type=int, default=1500)
+    ap.add_argument("--lines", type=int, default=150)
+    ap.add_argument("--check", type=int, default=20, help="素朴な BFS と突き合わせる出発駅の数")
+    args = ap.parse_args()
+
+    for shared in (127, 128, 256, 300):
+        check_shared_stations(shared)
+
+    if args.snapshot:
+        df = StationSnapshot(args.snapshot).load()[["station_name", "line_name"]].astype(str)
+    else:
+        df = make_network(args.stations, args.lines)
+
+    start = time.perf_counter()
+    graph = StationGraph(df)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dist = graph.all_pairs()
+    pairs_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    central = graph.centrality(dist)
+    central_time = time.perf_counter() - start
+
+    n = len(graph.stations)
+    finite = dist[dist != UNREACHABLE]
+    print(f"駅 {n} / 路線 {len(graph.lines)} / 駅×路線 {graph.incidence.nnz}")
+    print(f"グラフ作成: {build * 1000:.1f}ms")
+    print(f"全駅間の乗り換え回数: {pairs_time * 1000:.1f}ms ({n * n / pairs_time / 1e6:.1f}M ペア/秒)"
+          f"  最大 {int(finite.max())}回 / 平均 {finite.mean():.2f}回")
+    print(f"中心性: {central_time * 1000:.1f}ms")
+    print(f"中心性の上位:\n{central.head(5)}")
+
+    # 素朴な BFS と一致するか確認する
+    rng = np.random.default_rng(1)
+    mismatched = 0
+    for i in rng.choice(n, min(args.check, n), replace=False):
+        expected = bfs_transfers(df, graph.stations[i])
+        got = {graph.stations[j]: int(d) for j, d in enumerate(dist[i]) if d != UNREACHABLE}
+        mismatched += got != expected
+    print(f"BFS との不一致: {mismatched} / {min(args.check, n)}駅")
+    if mismatched:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import glob
+import os
+import sqlite3
+import time
+import zlib
+
+from page_parser import PARSERS, get_parser
+
+
+def load_corpus_dir(corpus_dir):
+    """保存しておいた駅ページ（*.html）を読み込む"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def load_corpus_cache(cache_dir):
+    """HttpCache に溜まっている駅ページ（カテゴリ以外）を読み込む"""
+    conn = sqlite3.connect(os.path.join(cache_dir, "index.db"))
+    rows = conn.execute("SELECT url, digest FROM entries WHERE url NOT LIKE '%Category:%' ORDER BY url").fetchall()
+    conn.close()
+    pages = []
+    for url, digest in rows:
+        path = os.path.join(cache_dir, "objects", digest[:2], digest)
+        if not os.path.exists(path): continue
+        with open(path, "rb") as f:
+            pages.append((url, zlib.decompress(f.read()).decode("utf-8")))
+    return pages
+
+
+def run_parser(parser, pages, repeat):
+    results = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for name, html in pages:
+            try:
+                results[name] = parser.parse_detail(html)
+            except Exception as e:
+                results[name] = f"error: {type(e).__name__}"
+    elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="駅ページ解析のベンチマーク（bs4 と同じ結果になるかも確認する）")
+    ap.add_argument("--corpus", help="駅ページの HTML を置いたディレクトリ")
+    ap.add_argument("--cache-dir", help="main.py の HttpCache ディレクトリから読み込む")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--parsers", default=",".join(PARSERS))
+    args = ap.parse_args()
+
+    if args.corpus:
+        pages = load_corpus_dir(args.corpus)
+    elif args.cache_dir:
+        pages = load_corpus_cache(args.cache_dir)
+    else:
+        ap.error("--corpus か --cache-dir を指定してください")
+    if not pages:
+        ap.error("ページが1件もありません")
+
+    print(f"ページ数: {len(pages)} / 繰り返し: {args.repeat}")
+    baseline = None
+    mismatches_total = 0
+    for name in args.parsers.split(","):
+        results, elapsed = run_parser(get_parser(name), pages, args.repeat)
+        per_page = elapsed / (len(pages) * args.repeat)
+        line = f"{name:>5}: {elapsed:.3f}秒  {per_page * 1000:.2f}ms/ページ  {1 / per_page:.1f}ページ/秒"
+        if baseline is None:
+            baseline = (results, elapsed)
+        else:
+            diff = [k for k in results if results[k] != baseline[0][k]]
+            mismatches_total += len(diff)
+            line += f"  x{baseline[1] / elapsed:.1f}  不一致: {len(diff)}件"
+            for k in diff[:5]:
+                print(f"    [!] {k}\n        基準: {baseline[0][k]}\n        {name}: {results[k]}")
+        print(line)
+
+    # 不一致があれば終了コードで知らせる
+    raise SystemExit(1 if mismatches_total else 0)
+
+
+if __name__ == "__main__":
+    main()
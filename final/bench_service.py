@@ -0,0 +1,111 @@
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+from urllib.parse import quote, urlparse
+
+import numpy as np
+
+from analysis import StationAnalyzer
+from synth_stations import make_stations
+from query_service import QueryService, start_query_server
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def client(base_url, areas, weights, requests, batch_ratio, batch_size, seed, latencies, errors):
+    """1本の keep-alive 接続から requests 回問い合わせて、1回ごとの時間（ミリ秒）を記録する"""
+    rng = np.random.default_rng(seed)
+    url = urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port)
+    for _ in range(requests):
+        start = time.perf_counter()
+        if rng.random() < batch_ratio:
+            body = json.dumps({"areas": list(rng.choice(areas, batch_size, p=weights))}, ensure_ascii=False)
+            conn.request("POST", "/batch", body.encode("utf-8"), {"Content-Type": "application/json"})
+        else:
+            conn.request("GET", f"/area?name={quote(rng.choice(areas, p=weights))}")
+        response = conn.getresponse()
+        response.read()
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status >= 500: errors.append(response.status)
+    conn.close()
+
+
+def run_load(base_url, areas, clients, requests, batch_ratio, batch_size, skew):
+    # よく聞かれる区とあまり聞かれない区がある（Zipf 風の偏り）
+    weights = 1 / np.arange(1, len(areas) + 1) ** skew
+    weights /= weights.sum()
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client, args=(base_url, areas, weights, requests, batch_ratio,
+                                                     batch_size, seed, latencies, errors))
+               for seed in range(clients)]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - start
+    return {"requests": len(latencies), "errors": len(errors), "rps": len(latencies) / elapsed,
+            "p50": percentile(latencies, 50), "p99": percentile(latencies, 99),
+            "mean": statistics.fmean(latencies) if latencies else float("nan")}
+
+
+def fetch_stats(base_url):
+    url = urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port)
+    conn.request("GET", "/stats")
+    stats = json.loads(conn.getresponse().read())
+    conn.close()
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="query_service.py に負荷をかけて p50/p99 を測る")
+    ap.add_argument("--url", help="起動済みのサービス（指定しなければ合成データでその場に立ち上げる）")
+    ap.add_argument("--areas", help="--url のときに問い合わせる区（カンマ区切り）")
+    ap.add_argument("--rows", type=int, default=1_000_000, help="その場に立ち上げるときの合成データの行数")
+    ap.add_argument("--clients", type=int, default=8, help="同時に問い合わせる接続の数")
+    ap.add_argument("--requests", type=int, default=500, help="1接続あたりの問い合わせ回数")
+    ap.add_argument("--batch-ratio", type=float, default=0.1, help="/batch の割合")
+    ap.add_argument("--batch-size", type=int, default=10)
+    ap.add_argument("--skew", type=float, default=1.1, help="区の人気の偏り（Zipf の指数）")
+    ap.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = ap.parse_args()
+
+    load = dict(clients=args.clients, requests=args.requests, batch_ratio=args.batch_ratio,
+                batch_size=args.batch_size, skew=args.skew)
+    results = {}
+    if args.url:
+        areas = args.areas.split(",") if args.areas else ["大田区", "新宿区", "渋谷区", "千代田区", "港区"]
+        results["service"] = {**run_load(args.url, areas, **load), "stats": fetch_stats(args.url)}
+    else:
+        df = make_stations(args.rows)
+        areas = sorted(df["location"].unique()) + ["存在しない区"]
+        start = time.perf_counter()
+        StationAnalyzer(None, df=df)
+        # これまでの input() スクリプトは、1回聞くたびにこの読み込みをやり直していた
+        results["startup_ms"] = (time.perf_counter() - start) * 1000
+        for name, cache_size in [("no-cache", 0), ("lru", 1024)]:
+            service = QueryService(lambda: StationAnalyzer(None, df=df), cache_size, watch_interval=0)
+            server, base_url = start_query_server(service)
+            results[name] = {**run_load(base_url, areas, **load), "stats": service.stats()}
+            server.shutdown()
+            server.server_close()
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    if "startup_ms" in results:
+        print(f"StationAnalyzer の読み込み（1回ごとに起動する場合の毎回のコスト）: {results['startup_ms']:.0f}ms")
+    print(f"{'':<10} {'件数':>8} {'req/s':>9} {'p50(ms)':>9} {'p99(ms)':>9} {'ヒット率':>8} {'エラー':>6}")
+    for name, r in results.items():
+        if name == "startup_ms": continue
+        print(f"{name:<10} {r['requests']:>8} {r['rps']:>9.0f} {r['p50']:>9.2f} {r['p99']:>9.2f}"
+              f" {r['stats']['cache']['hit_ratio']:>8.1%} {r['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import requests
+
+from db_writer import MemoryWriter
+from main import WikiScraperPostgres
+from stub_api_server import DEFAULT_FIXTURE, start_stub_server
+
+
+def run_mode(mode, base_url, parser_backend):
+    """スタブサーバーに対して1モード分クロールして (秒, 行の集合) を返す"""
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper = WikiScraperPostgres(frontier_path=os.path.join(tmp, "frontier.db"),
+                                      parser_backend=parser_backend, base_url=base_url)
+        scraper.writer = MemoryWriter()
+        scraper.delay = 0
+        scraper.rate_per_sec = 1000
+        start = time.perf_counter()
+        if mode == "api":
+            scraper.fetch_all_api()
+        elif mode == "async":
+            scraper.fetch_all_async()
+        else:
+            scraper.fetch_all()
+        elapsed = time.perf_counter() - start
+        scraper.frontier.close()
+        return elapsed, set(scraper.writer.rows.values())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="HTML モードと API モードをスタブサーバーで比べるベンチマーク")
+    ap.add_argument("--fixture", default=DEFAULT_FIXTURE)
+    ap.add_argument("--latency", type=float, default=0.05, help="スタブサーバーの1リクエストあたりの遅延（秒）")
+    ap.add_argument("--parser", default="bs4")
+    ap.add_argument("--modes", default="html,api")
+    args = ap.parse_args()
+
+    results = {}
+    for mode in args.modes.split(","):
+        # モードごとにサーバーを立て直してリクエスト数を数える
+        server, base_url = start_stub_server(args.fixture, latency=args.latency)
+        try:
+            elapsed, rows = run_mode(mode, base_url, args.parser)
+            counts = requests.get(base_url + "/_stats", timeout=5).json()
+        finally:
+            server.shutdown()
+        results[mode] = rows
+        print(f"{mode:>5}: {elapsed:.2f}秒  リクエスト {sum(counts.values())}回 {json.dumps(counts, ensure_ascii=False)}  行数 {len(rows)}")
+
+    modes = list(results)
+    for other in modes[1:]:
+        only_a = results[modes[0]] - results[other]
+        only_b = results[other] - results[modes[0]]
+        print(f"{modes[0]} と {other} の行の差: {len(only_a) + len(only_b)}件")
+        for row in sorted(only_a)[:10]: print(f"    {modes[0]}のみ: {row}")
+        for row in sorted(only_b)[:10]: print(f"    {other}のみ: {row}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import contextlib
+import io
+import statistics
+import time
+
+import psycopg2
+
+from analysis import StationAnalyzer
+from station_views import refresh_hub_view
+from synth_stations import load_postgres, make_stations
+
+DB_PARAMS = {"host": "localhost", "database": "dsprog2db", "user": "igarashiayaka", "password": ""}
+
+
+def load_table(db_params, schema, rows):
+    # 本物の stations を触らないように、別スキーマに同じ名前のテーブルを作る
+    df = make_stations(rows)
+    load_postgres(df, db_params, schema)
+    return sorted(df["location"].unique())
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run_mode(db_params, areas, **kwargs):
+    analyzer, startup = timed(StationAnalyzer, db_params, **kwargs)
+    per_area = [timed(analyzer.analyze_area, area)[1] for area in areas]
+    results, all_time = timed(analyzer.analyze_all)
+    return {"startup": startup, "p50": statistics.median(per_area), "max": max(per_area),
+            "all": all_time, "results": results}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="pandas 集計と Postgres 集計（ビューあり・なし）の比較")
+    ap.add_argument("--sizes", default="10000,100000,1000000", help="stations の行数（カンマ区切り）")
+    ap.add_argument("--schema", default="bench_sql", help="ベンチマーク用に作って消すスキーマ")
+    ap.add_argument("--keep", action="store_true", help="終わってもスキーマを消さない")
+    args = ap.parse_args()
+
+    db_params = {**DB_PARAMS, "options": f"-c search_path={args.schema}"}
+    modes = [
+        ("pandas", {}),
+        ("pushdown", {"lazy": True}),
+        ("sql", {"engine": "sql", "use_view": False}),
+        ("sql+view", {"engine": "sql", "use_view": True}),
+    ]
+    print(f"{'行数':>10} {'モード':<10} {'起動(ms)':>10} {'区p50(ms)':>10} {'区max(ms)':>10} {'全区(ms)':>10}")
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            areas = load_table(db_params, args.schema, size)
+            baseline = None
+            for name, kwargs in modes:
+                if name == "sql+view":
+                    conn = psycopg2.connect(**db_params)
+                    _, refresh = timed(refresh_hub_view, conn)
+                    conn.close()
+                    print(f"{size:>10} {'(ビュー更新)':<10} {refresh:>10.1f}")
+                r = run_mode(db_params, areas, **kwargs)
+                # どのモードでも同じ結果になっているか確認する
+                if baseline is None:
+                    baseline = r["results"]
+                elif any(not r["results"][a].equals(baseline[a]) for a in baseline):
+                    raise SystemExit(f"{name} の結果が pandas と一致しません（{size}行）")
+                print(f"{size:>10} {name:<10} {r['startup']:>10.1f} {r['p50']:>10.2f} {r['max']:>10.2f} {r['all']:>10.1f}")
+    finally:
+        if not args.keep:
+            conn = psycopg2.connect(**DB_PARAMS)
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+            conn.commit()
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
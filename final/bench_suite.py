@@ -0,0 +1,191 @@
+import argparse
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from analysis import StationAnalyzer
+from station_names import StationNameResolver
+from synth_stations import describe, load_postgres, load_sqlite, make_stations, read_sqlite
+
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def best_of(repeat, fn, *args, **kwargs):
+    """repeat 回測って一番速かった時間（ほかのプロセスの影響を減らす）"""
+    times = []
+    for _ in range(repeat):
+        result, seconds = timed(fn, *args, **kwargs)
+        times.append(seconds)
+    return result, min(times)
+
+
+def area_latencies(analyzer, areas, rounds=3):
+    """全区を rounds 周問い合わせたときの1回ごとの時間"""
+    times = []
+    for _ in range(rounds):
+        for area in areas:
+            times.append(timed(analyzer.analyze_area, area)[1])
+    return {"area_p50": float(np.percentile(times, 50)), "area_p99": float(np.percentile(times, 99))}
+
+
+def run_size(rows, args, db_params):
+    results = {}
+    df, results["generate"] = timed(make_stations, rows, wards=args.wards, seed=args.seed)
+    areas = sorted(df["location"].cat.categories)
+
+    # --- 読み込み（SQLite か Postgres に入れて、読み戻す） ---
+    if args.backend == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(prefix="bench_suite_"), "stations.db")
+        _, results["load"] = timed(load_sqlite, df, path)
+        raw, results["read"] = timed(read_sqlite, path)
+        os.remove(path)
+    else:
+        _, results["load"] = timed(load_postgres, df, db_params, args.schema)
+        raw, results["read"] = timed(StationAnalyzer(db_params, lazy=True)._read_table)
+
+    # --- pandas（eager）モード ---
+    _, results["cleanse"] = best_of(args.repeat, StationAnalyzer._cleanse, raw)
+    analyzer, results["startup"] = best_of(args.repeat, StationAnalyzer, None, df=raw)
+    results.update(area_latencies(analyzer, areas))
+    _, results["analyze_all"] = best_of(args.repeat, analyzer.analyze_all)
+
+    # --- Postgres に集計を任せるモード ---
+    if args.backend == "postgres":
+        for name, kwargs in [("pushdown", {"lazy": True}), ("sql", {"engine": "sql", "use_view": False}),
+                             ("sql_view", {"engine": "sql", "use_view": True})]:
+            lazy = StationAnalyzer(db_params, **kwargs)
+            results.update({f"{name}_{k}": v for k, v in area_latencies(lazy, areas, rounds=1).items()})
+            _, results[f"{name}_analyze_all"] = timed(lazy.analyze_all)
+
+    # --- 駅名の表記ゆれの解消（バッチ処理） ---
+    if args.resolve and rows <= args.resolve_max_rows:
+        names = df.groupby(["station_name", "location"], observed=True).size().rename("rows").reset_index()
+        _, results["resolve"] = timed(StationNameResolver().resolve, names.astype({"station_name": str, "location": str}))
+    return describe(df), results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results_dir, record):
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{record['started_at'].replace(':', '').replace('-', '')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_baseline(results_dir, baseline):
+    """--compare に渡されたファイル（latest なら今回より前の一番新しい結果）"""
+    if baseline != "latest":
+        with open(baseline, encoding="utf-8") as f:
+            return json.load(f), baseline
+    paths = sorted(glob.glob(os.path.join(results_dir, "*.json")))
+    if not paths: return None, None
+    with open(paths[-1], encoding="utf-8") as f:
+        return json.load(f), paths[-1]
+
+
+def compare(record, baseline, threshold):
+    """同じ行数・同じ段階どうしで時間の比を出す。threshold 倍より遅くなったものを返す"""
+    old = {(r["rows"], stage): seconds for r in baseline["runs"] for stage, seconds in r["results"].items()}
+    regressions = []
+    print(f"\n--- {baseline['started_at']} ({baseline.get('git')}) との比較 ---")
+    print(f"{'行数':>10} {'段階':<24} {'前回':>10} {'今回':>10} {'比':>7}")
+    for run in record["runs"]:
+        for stage, seconds in run["results"].items():
+            before = old.get((run["rows"], stage))
+            if before is None or before <= 0: continue
+            ratio = seconds / before
+            mark = " ⚠️" if ratio > threshold else ""
+            print(f"{run['rows']:>10,} {stage:<24} {before:>10.4f} {seconds:>10.4f} {ratio:>6.2f}x{mark}")
+            if ratio > threshold:
+                regressions.append((run["rows"], stage, ratio))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="合成 stations で StationAnalyzer の各段階の時間を測り、結果を残して前回と比べる")
+    ap.add_argument("--sizes", default="10000,100000,1000000", help="行数（カンマ区切り、1000万まで）")
+    ap.add_argument("--backend", choices=["sqlite", "postgres"], default="sqlite",
+                    help="合成データを入れる DB（postgres なら SQL 集計のモードも測る）")
+    ap.add_argument("--schema", default="bench_suite", help="postgres のときに作って消すスキーマ")
+    ap.add_argument("--wards", type=int, default=23)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3, help="速い段階は何回か測って最小値をとる")
+    ap.add_argument("--resolve", action="store_true", help="駅名の表記ゆれの解消も測る")
+    ap.add_argument("--resolve-max-rows", type=int, default=1_000_000, help="これより大きいときは表記ゆれの解消を測らない")
+    ap.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR)
+    ap.add_argument("--compare", help="比べる結果ファイル（latest で前回の結果）")
+    ap.add_argument("--threshold", type=float, default=1.2, help="この倍率より遅くなったら失敗にする")
+    args = ap.parse_args()
+
+    db_params = None
+    if args.backend == "postgres":
+        from bench_sql import DB_PARAMS
+        db_params = {**DB_PARAMS, "options": f"-c search_path={args.schema}"}
+    # 結果を保存する前に、比べる相手を読んでおく
+    baseline, baseline_path = load_baseline(args.results_dir, args.compare) if args.compare else (None, None)
+
+    record = {
+        "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("compare", "results_dir")},
+        "runs": [],
+    }
+    try:
+        for rows in (int(s) for s in args.sizes.split(",")):
+            print(f"{rows:,}行 ...", flush=True)
+            data, results = run_size(rows, args, db_params)
+            record["runs"].append({"rows": rows, "data": data, "results": results})
+            print("  " + "  ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in results.items()))
+    finally:
+        if args.backend == "postgres":
+            import psycopg2
+            from bench_sql import DB_PARAMS
+            conn = psycopg2.connect(**DB_PARAMS)
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+            conn.commit()
+            conn.close()
+
+    path = save_results(args.results_dir, record)
+    print(f"結果を保存しました: {path}")
+    if args.compare:
+        if baseline is None:
+            print("比べる前回の結果がありません")
+            return
+        regressions = compare(record, baseline, args.threshold)
+        if regressions:
+            raise SystemExit(f"{len(regressions)}件の段階が {baseline_path} より {args.threshold}倍以上遅くなりました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+import contextlib
+import datetime
+import io
+import threading
+import time
+
+from psycopg2 import pool
+from psycopg2.extras import execute_values
+
+from station_views import refresh_hub_view
+
+# 記事のリビジョン管理に使う列とテーブル（なければ最初の接続時に作る）
+SCHEMA_SQL = """
+    ALTER TABLE stations ADD COLUMN IF NOT EXISTS page_title TEXT;
+    ALTER TABLE stations ADD COLUMN IF NOT EXISTS rev_id BIGINT;
+    ALTER TABLE stations ADD COLUMN IF NOT EXISTS scraped_at TIMESTAMPTZ;
+    CREATE INDEX IF NOT EXISTS idx_stations_page_title ON stations (page_title);
+    CREATE TABLE IF NOT EXISTS station_pages (
+        page_title TEXT PRIMARY KEY,
+        rev_id BIGINT,
+        scraped_at TIMESTAMPTZ NOT NULL
+    );
+"""
+
+STATION_COLUMNS = "station_name, line_name, company_name, location"
+PAGE_COLUMNS = "station_name, line_name, company_name, location, page_title, rev_id, scraped_at"
+
+# 記事単位で保存した行は最新の内容で上書きする
+PAGE_UPSERT = """
+    ON CONFLICT (station_name, line_name) DO UPDATE SET
+        company_name = EXCLUDED.company_name,
+        location = EXCLUDED.location,
+        page_title = EXCLUDED.page_title,
+        rev_id = EXCLUDED.rev_id,
+        scraped_at = EXCLUDED.scraped_at
+"""
+
+
+class StationWriter:
+    """stations への書き込みをバッファして、まとめて INSERT するクラス
+
+    batch_size 件たまるか flush_interval 秒経つとフラッシュし、close() で残りを書き出す。
+    flush_interval は別スレッドでも見ているので、新しい行が来なくなっても溜まった行は書き出される。
+    書き込みに失敗したバッチは捨てるが、失敗は覚えておいて次の flush() で例外として出す
+    （呼び出し側は、前回の flush() 以降に渡した行が保存されていないものとして扱う）。
+    method="values" は複数行 VALUES、method="copy" は一時テーブルへの COPY → マージ。
+    add_page() で記事単位に渡された行は、その記事の古い行を消してから上書きし、
+    station_pages にリビジョンIDと取得時刻を記録する。
+    """
+
+    def __init__(self, db_params, batch_size=500, flush_interval=5.0, method="values", max_conn=4):
+        self.db_params = db_params
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.method = method
+        self.max_conn = max_conn
+        self.pool = None
+        self.buffer = []
+        self.pages = []
+        self.buffered_rows = 0
+        self.lock = threading.Lock()
+        # プールの作成（接続とスキーマの作成）はバッファのロックとは別にする（add() を待たせない）
+        self.pool_lock = threading.Lock()
+        # flush_interval ごとに古くなったバッファを書き出すスレッド（最初の行が来たときに起こす）
+        self.flusher = None
+        self.closing = threading.Event()
+        # プールの上限を超えて getconn しないように同時フラッシュ数を絞る
+        self.slots = threading.BoundedSemaphore(max_conn)
+        self.last_flush = time.monotonic()
+        # 統計
+        self.rows_submitted = 0
+        self.rows_written = 0
+        self.rows_updated = 0
+        self.rows_deduplicated = 0
+        self.rows_failed = 0
+        self.batches = 0
+        # add() / add_page() の途中のフラッシュで起きた失敗（次の flush() で出す）
+        self.error = None
+
+    def _get_pool(self):
+        # 接続はフラッシュが必要になって初めて作る
+        if self.pool is None:
+            self.pool = pool.ThreadedConnectionPool(1, self.max_conn, **self.db_params)
+            conn = self.pool.getconn()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(SCHEMA_SQL)
+                conn.commit()
+            finally:
+                self.pool.putconn(conn)
+        return self.pool
+
+    @contextlib.contextmanager
+    def connection(self):
+        """プールから接続を1本借りる"""
+        with self.slots:
+            with self.pool_lock:
+                conn_pool = self._get_pool()
+            conn = conn_pool.getconn()
+            try:
+                yield conn
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn_pool.putconn(conn)
+
+    def add(self, st, ln, cp, lc):
+        with self.lock:
+            self.buffer.append((st, ln, cp, lc))
+            self.rows_submitted += 1
+            self.buffered_rows += 1
+            self._start_flusher()
+            batch = self._take() if self._due() else None
+        if batch:
+            self._write_deferred(batch)
+
+    def add_page(self, page_title, rev_id, rows):
+        """1記事分の行をまとめて渡す（記事のリビジョンIDも記録する）"""
+        scraped_at = datetime.datetime.now(datetime.timezone.utc)
+        with self.lock:
+            self.pages.append((page_title, rev_id, scraped_at, list(rows)))
+            self.rows_submitted += len(rows)
+            self.buffered_rows += len(rows)
+            self._start_flusher()
+            batch = self._take() if self._due() else None
+        if batch:
+            self._write_deferred(batch)
+
+    def flush(self):
+        """残りを書き出す。前回の flush() 以降に失敗したバッチがあれば例外を出す"""
+        with self.lock:
+            batch = self._take()
+        try:
+            if batch[0] or batch[1]:
+                self._write(*batch)
+        finally:
+            with self.lock:
+                error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def refresh_views(self):
+        """stations から作る集計ビュー（区ごとのハブ駅など）を最新にする"""
+        with self.connection() as conn:
+            refresh_hub_view(conn)
+
+    def close(self):
+        self.closing.set()
+        if self.flusher is not None:
+            self.flusher.join()
+            self.flusher = None
+        try:
+            self.flush()
+        finally:
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
+
+    def stats(self):
+        return {
+            "submitted": self.rows_submitted,
+            "written": self.rows_written,
+            "updated": self.rows_updated,
+            "deduplicated": self.rows_deduplicated,
+            "failed": self.rows_failed,
+            "batches": self.batches,
+        }
+
+    def known_revisions(self):
+        """station_pages に記録済みの {記事タイトル: リビジョンID}"""
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT page_title, rev_id FROM station_pages")
+                return dict(cur.fetchall())
+
+    def remove_pages(self, titles):
+        """なくなった記事の行を消して、消した行数を返す"""
+        if not titles: return 0
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM stations WHERE page_title = ANY(%s)", (list(titles),))
+                removed = cur.rowcount
+                cur.execute("DELETE FROM station_pages WHERE page_title = ANY(%s)", (list(titles),))
+            conn.commit()
+        return removed
+
+    def _start_flusher(self):
+        # self.lock を持って呼ぶ
+        if self.flusher is None and self.flush_interval > 0 and not self.closing.is_set():
+            self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self.flusher.start()
+
+    def _flush_loop(self):
+        while not self.closing.wait(self.flush_interval / 2):
+            with self.lock:
+                stale = self.buffered_rows and time.monotonic() - self.last_flush >= self.flush_interval
+                batch = self._take() if stale else None
+            if batch:
+                self._write_deferred(batch)
+
+    def _due(self):
+        return (self.buffered_rows >= self.batch_size
+                or time.monotonic() - self.last_flush >= self.flush_interval)
+
+    def _take(self):
+        batch, self.buffer = self.buffer, []
+        pages, self.pages = self.pages, []
+        self.buffered_rows = 0
+        self.last_flush = time.monotonic()
+        return batch, pages
+
+    def _write_deferred(self, batch):
+        # 行を渡しただけの呼び出し側には出さず、次の flush() で出す
+        try:
+            self._write(*batch)
+        except Exception:
+            pass
+
+    def _write(self, batch, pages):
+        # 同じバッチ内の (駅名, 路線名) の重複は送る前に落とす（ON CONFLICT DO NOTHING と同じく最初の行を残す）
+        unique = {}
+        for r in batch:
+            unique.setdefault((r[0], r[1]), r)
+        unique = list(unique.values())
+        page_rows = {}
+        for title, rev_id, scraped_at, rows in pages:
+            for r in rows:
+                page_rows[(r[0], r[1])] = (*r, title, rev_id, scraped_at)
+        submitted = len(batch) + sum(len(p[3]) for p in pages)
+
+        written, updated = 0, 0
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cur:
+                    if unique:
+                        written += self._insert(cur, STATION_COLUMNS, unique,
+                                                "ON CONFLICT (station_name, line_name) DO NOTHING")
+                    if pages:
+                        written_p, updated = self._write_pages(cur, pages, list(page_rows.values()))
+                        written += written_p
+                conn.commit()
+        except Exception as e:
+            with self.lock:
+                self.rows_failed += submitted
+                self.error = self.error or e
+            print(f"      [!] 保存失敗 ({submitted}件): {e}")
+            raise
+
+        with self.lock:
+            self.rows_written += written
+            self.rows_updated += updated
+            self.rows_deduplicated += submitted - written - updated
+            self.batches += 1
+        print(f"      [SUCCESS] {written}件保存 / {updated}件更新 (重複 {submitted - written - updated}件)")
+
+    def _write_pages(self, cur, pages, rows):
+        # 記事から消えた路線の行が残らないよう、その記事の行をいったん消してから入れ直す
+        titles = list({p[0] for p in pages})
+        cur.execute("DELETE FROM stations WHERE page_title = ANY(%s)", (titles,))
+        removed = cur.rowcount
+        changed = self._insert(cur, PAGE_COLUMNS, rows, PAGE_UPSERT) if rows else 0
+        latest = {p[0]: (p[0], p[1], p[2]) for p in pages}
+        execute_values(cur, """
+            INSERT INTO station_pages (page_title, rev_id, scraped_at) VALUES %s
+            ON CONFLICT (page_title) DO UPDATE SET rev_id = EXCLUDED.rev_id, scraped_at = EXCLUDED.scraped_at
+        """, list(latest.values()), page_size=len(latest))
+        # 消してから入れ直した分は「更新」として数える
+        updated = min(removed, changed)
+        return changed - updated, updated
+
+    def _insert(self, cur, columns, rows, conflict):
+        if self.method == "copy":
+            return self._insert_copy(cur, columns, rows, conflict)
+        return self._insert_values(cur, columns, rows, conflict)
+
+    def _insert_values(self, cur, columns, rows, conflict):
+        inserted = execute_values(cur, f"""
+            INSERT INTO stations ({columns})
+            VALUES %s
+            {conflict}
+            RETURNING 1;
+        """, rows, page_size=len(rows), fetch=True)
+        return len(inserted)
+
+    def _insert_copy(self, cur, columns, rows, conflict):
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS stations_staging
+                (station_name TEXT, line_name TEXT, company_name TEXT, location TEXT,
+                 page_title TEXT, rev_id BIGINT, scraped_at TIMESTAMPTZ)
+                ON COMMIT DELETE ROWS;
+        """)
+        cur.execute("TRUNCATE stations_staging")
+        buf = io.StringIO()
+        for row in rows:
+            buf.write("\t".join(_copy_escape(v) for v in row) + "\n")
+        buf.seek(0)
+        cur.copy_expert(f"COPY stations_staging ({columns}) FROM STDIN", buf)
+        cur.execute(f"""
+            INSERT INTO stations ({columns})
+            SELECT {columns} FROM stations_staging
+            {conflict};
+        """)
+        return cur.rowcount
+
+
+def _copy_escape(value):
+    # COPY の text 形式で特別扱いされる文字をエスケープ
+    if value is None: return "\\N"
+    if isinstance(value, datetime.datetime): return value.isoformat()
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class MemoryWriter:
+    """DBに書かずに行をメモリに溜めるだけの writer（ベンチマーク・動作確認用）"""
+
+    def __init__(self):
+        self.rows = {}
+        self.page_revisions = {}
+        self.page_keys = {}
+        self.rows_submitted = 0
+
+    def add(self, st, ln, cp, lc):
+        self.rows_submitted += 1
+        self.rows.setdefault((st, ln), (st, ln, cp, lc))
+
+    def add_page(self, page_title, rev_id, rows):
+        # 記事の古い行を消してから入れ直す（StationWriter と同じ動き）
+        for key in self.page_keys.get(page_title, ()):
+            self.rows.pop(key, None)
+        self.page_revisions[page_title] = rev_id
+        self.page_keys[page_title] = [(r[0], r[1]) for r in rows]
+        for r in rows:
+            self.rows_submitted += 1
+            self.rows[(r[0], r[1])] = tuple(r)
+
+    def known_revisions(self):
+        return dict(self.page_revisions)
+
+    def remove_pages(self, titles):
+        removed = 0
+        for title in titles:
+            for key in self.page_keys.pop(title, ()):
+                removed += self.rows.pop(key, None) is not None
+            self.page_revisions.pop(title, None)
+        return removed
+
+    def flush(self):
+        pass
+
+    def refresh_views(self):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {
+            "submitted": self.rows_submitted,
+            "written": len(self.rows),
+            "updated": 0,
+            "deduplicated": self.rows_submitted - len(self.rows),
+            "failed": 0,
+            "batches": 0,
+        }
@@ -0,0 +1,99 @@
+import sqlite3
+import time
+
+PENDING = "pending"
+CLAIMED = "claimed"
+VISITED = "visited"
+FAILED = "failed"
+
+
+class CrawlFrontier:
+    """クロール対象URLの待ち行列を SQLite に保存するクラス
+
+    状態は pending → claimed → visited / failed と進む。URLはメモリに溜めず
+    next_batch() で少しずつ取り出すので、カテゴリが大きくてもメモリは増えない。
+    落ちた後に開き直すと claimed は pending に戻り、visited は取り直さない。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_frontier_state ON frontier (state, seq)")
+        # 前回の途中で止まった分はやり直し
+        self.conn.execute("UPDATE frontier SET state = ? WHERE state = ?", (PENDING, CLAIMED))
+        self.conn.commit()
+
+    def add(self, url, kind):
+        if not url: return
+        self.conn.execute("INSERT OR IGNORE INTO frontier (url, kind, updated_at) VALUES (?, ?, ?)",
+                          (url, kind, time.time()))
+
+    def add_many(self, urls, kind):
+        now = time.time()
+        self.conn.executemany("INSERT OR IGNORE INTO frontier (url, kind, updated_at) VALUES (?, ?, ?)",
+                              [(u, kind, now) for u in urls if u])
+
+    def next_batch(self, size=100):
+        """pending を古い順に size 件取り出して claimed にする"""
+        rows = self.conn.execute(
+            "SELECT seq, kind, url FROM frontier WHERE state = ? ORDER BY seq LIMIT ?", (PENDING, size)
+        ).fetchall()
+        if rows:
+            self.conn.executemany("UPDATE frontier SET state = ? WHERE seq = ?",
+                                  [(CLAIMED, seq) for seq, _, _ in rows])
+        return [(kind, url) for _, kind, url in rows]
+
+    def mark_visited(self, url):
+        self.conn.execute("UPDATE frontier SET state = ?, attempts = attempts + 1, error = NULL, updated_at = ? WHERE url = ?",
+                          (VISITED, time.time(), url))
+
+    def mark_failed(self, url, error):
+        self.conn.execute("UPDATE frontier SET state = ?, attempts = attempts + 1, error = ?, updated_at = ? WHERE url = ?",
+                          (FAILED, str(error)[:500], time.time(), url))
+
+    def requeue_visited(self):
+        """visited を pending に戻して、その件数を返す（前回のクロールが終わったあとに取り直すとき）"""
+        cur = self.conn.execute("UPDATE frontier SET state = ? WHERE state = ?", (PENDING, VISITED))
+        self.conn.commit()
+        return cur.rowcount
+
+    def retry_failed(self):
+        self.conn.execute("UPDATE frontier SET state = ? WHERE state = ?", (PENDING, FAILED))
+        self.conn.commit()
+
+    def reset(self):
+        self.conn.execute("DELETE FROM frontier")
+        self.conn.commit()
+
+    def has_pending(self):
+        row = self.conn.execute("SELECT 1 FROM frontier WHERE state IN (?, ?) LIMIT 1", (PENDING, CLAIMED)).fetchone()
+        return row is not None
+
+    def counts(self):
+        rows = self.conn.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state").fetchall()
+        counts = {PENDING: 0, CLAIMED: 0, VISITED: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        """前回の commit() 以降の変更を取り消す（取り出した URL は pending に戻る）"""
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+
+
+class HttpCache:
+    """取得したページをディスクに保存して、次回は条件付きGETで再検証するキャッシュ
+
+    本文は内容のハッシュ（sha256）をファイル名にして objects/ 以下に置き、
+    URL → (本文ハッシュ, ETag, Last-Modified) の対応は index.db に持つ。
+    合計サイズが max_bytes を超えたら最後に使われたのが古い順に消す（LRU）。
+    max_age 秒以内に取ったページはリクエストせずにそのまま返す。
+    """
+
+    def __init__(self, cache_dir, max_bytes=500 * 1024 * 1024, max_age=0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "index.db"))
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+        self.conn.commit()
+        # 統計
+        self.hits = 0          # リクエストせずにローカルから返した
+        self.revalidated = 0   # 304 Not Modified
+        self.misses = 0        # 本文をダウンロードした
+
+    def _object_path(self, digest):
+        return os.path.join(self.cache_dir, "objects", digest[:2], digest)
+
+    def lookup(self, url):
+        row = self.conn.execute(
+            "SELECT digest, etag, last_modified, fetched_at FROM entries WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None or not os.path.exists(self._object_path(row[0])):
+            return None
+        return {"digest": row[0], "etag": row[1], "last_modified": row[2], "fetched_at": row[3]}
+
+    def is_fresh(self, entry):
+        return self.max_age > 0 and time.time() - entry["fetched_at"] < self.max_age
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry is None: return headers
+        if entry["etag"]: headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]: headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read(self, url, entry):
+        """キャッシュの本文を返す（最終アクセス時刻も更新する）"""
+        with open(self._object_path(entry["digest"]), "rb") as f:
+            body = zlib.decompress(f.read()).decode("utf-8")
+        self.conn.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        return body
+
+    def serve_fresh(self, url, entry):
+        self.hits += 1
+        return self.read(url, entry)
+
+    def not_modified(self, url, entry):
+        """304 が返ってきたときに呼ぶ"""
+        self.revalidated += 1
+        self.conn.execute("UPDATE entries SET fetched_at = ? WHERE url = ?", (time.time(), url))
+        return self.read(url, entry)
+
+    def handle_response(self, url, entry, status, text, headers):
+        """レスポンスを見て、304ならキャッシュの本文を、200なら保存してから本文を返す"""
+        if status == 304 and entry is not None:
+            return self.not_modified(url, entry)
+        if status == 200:
+            self.store(url, text, headers.get("ETag"), headers.get("Last-Modified"))
+        return text
+
+    def store(self, url, text, etag=None, last_modified=None):
+        self.misses += 1
+        data = zlib.compress(text.encode("utf-8"))
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+        old = self.conn.execute("SELECT digest FROM entries WHERE url = ?", (url,)).fetchone()
+        now = time.time()
+        self.conn.execute("""
+            INSERT OR REPLACE INTO entries (url, digest, etag, last_modified, size, fetched_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (url, digest, etag, last_modified, len(data), now, now))
+        if old and old[0] != digest:
+            self._drop_object_if_unused(old[0])
+        self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        """合計サイズが上限を超えていたら LRU で消す"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes: return
+        for url, digest, size in self.conn.execute(
+                "SELECT url, digest, size FROM entries ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes: break
+            self.conn.execute("DELETE FROM entries WHERE url = ?", (url,))
+            self._drop_object_if_unused(digest)
+            total -= size
+        self.conn.commit()
+
+    def _drop_object_if_unused(self, digest):
+        # 同じ本文を別のURLが使っていれば残す
+        if self.conn.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+            return
+        try:
+            os.remove(self._object_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        total = self.hits + self.revalidated + self.misses
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.revalidated) / total if total else 0.0,
+        }
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -1,101 +1,331 @@
+import argparse
+import asyncio
 import requests
-from bs4 import BeautifulSoup
 import time
-import psycopg2
+from db_writer import StationWriter
+from frontier import CrawlFrontier
+from http_cache import HttpCache
+from page_parser import extract_revision_id, get_parser
+from mediawiki_api import url_to_title
+from metrics import CrawlMetrics, MetricsExporter
+
+
+def check_status(res):
+    """200 以外は例外にする（429 や 5xx のエラーページを、リンクのないページとして visited にしない）"""
+    if res.status_code != 200:
+        raise requests.HTTPError(f"{res.status_code} {res.reason}: {res.url}", response=res)
+
 
 class WikiScraperPostgres:
-    def __init__(self):
-        self.base_url = "https://ja.wikipedia.org"
+    def __init__(self, concurrency=8, rate_per_sec=5.0, batch_size=500, write_method="values",
+                 frontier_path="crawl_frontier.db", cache_dir=None, cache_max_age=0,
+                 parser_backend="bs4", base_url="https://ja.wikipedia.org"):
+        self.base_url = base_url
         self.headers = {"User-Agent": "Mozilla/5.0"}
+        # 同期モード・APIモードは Session、非同期モードは httpx の transport を通して取得する
+        # （記録・再生のときはここを差し替える）
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.transport = None
         self.db_params = {
             "host": "localhost",
             "database": "dsprog2db",
             "user": "igarashiayaka",
             "password": ""
         }
-        self.processed_urls = set()
-
-    def fetch_all(self):
+        # 訪問済み・未訪問のURLはメモリではなく SQLite に記録する（落ちても続きから再開できる）
+        self.frontier = CrawlFrontier(frontier_path)
+        # 取得したページのディスクキャッシュ（None なら使わない）
+        self.cache = HttpCache(cache_dir, max_age=cache_max_age) if cache_dir else None
         # 探索開始カテゴリ
-        start_categories = [
+        self.start_categories = [
             "/wiki/Category:%E6%9D%B1%E4%BA%AC%E9%83%BD%E3%81%AE%E9%89%84%E9%81%93%E9%A7%85",
             "/wiki/Category:%E6%9D%B1%E4%BA%AC%E9%83%BD%E5%8C%BA%E9%83%A8%E3%81%AE%E9%89%84%E9%81%93%E9%A7%85"
         ]
-        for cat in start_categories:
-            self.crawl_category(self.base_url + cat)
+        # HTML解析の実装（"bs4" か "lxml"）
+        self.page_parser = get_parser(parser_backend)
+        # 非同期モード用: 同時リクエスト数と1ホストあたりの毎秒リクエスト数
+        self.concurrency = concurrency
+        self.rate_per_sec = rate_per_sec
+        # 同期モードで駅ページごとに入れる待ち時間（秒）
+        self.delay = 0.2
+        # 保存はプール + バッチ書き込み（1行ごとの接続・コミットをやめる）
+        self.writer = StationWriter(self.db_params, batch_size=batch_size, method=write_method)
+        # ステージ別の所要時間・件数・失敗理由（軽いので常に集める）
+        self.metrics = CrawlMetrics()
+        self.exporter = None
+        # チェックポイントで保存に失敗したら True（クロールはそこで止める）
+        self.save_failed = False
+
+    def export_metrics(self, path, interval=15.0):
+        """interval 秒ごとに Prometheus のテキストファイルへメトリクスを書き出す"""
+        self.exporter = MetricsExporter(self.metrics, path, interval).start()
+
+    def use_replay(self, archive, latency=0.0):
+        """ネットに出ずに、記録したアーカイブからページを返すようにする"""
+        from replay import ReplayAdapter, ReplayTransport
+        adapter = ReplayAdapter(archive, latency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.transport = ReplayTransport(archive, latency)
+
+    def record_to(self, archive):
+        """取得したレスポンスをすべてアーカイブに記録する"""
+        from replay import RecordingAdapter, RecordingTransport
+        adapter = RecordingAdapter(archive)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.transport = RecordingTransport(archive)
+
+    def seed(self, revalidate=True):
+        """開始カテゴリを積む
+
+        前回のクロールが最後まで終わっていて（未訪問が残っていない）ページキャッシュがあれば、
+        訪問済みのページも積み直す（キャッシュの ETag / Last-Modified で再検証するので、ほとんどは 304 で済む）。
+        途中で止まったクロールは、これまでどおり未訪問の分から再開する。
+        """
+        if revalidate and self.cache is not None and not self.frontier.has_pending():
+            requeued = self.frontier.requeue_visited()
+            if requeued:
+                print(f"前回のクロールは完了しているので、訪問済みの {requeued}件をキャッシュで再検証します")
+        for cat in self.start_categories:
+            self.frontier.add(self.base_url + cat, "category")
+        self.frontier.commit()
+
+    def fetch_all(self):
+        self.seed()
+        # フロンティアが空になるまで少しずつ取り出して処理する（再帰しない）
+        while True:
+            batch = self.frontier.next_batch(100)
+            if not batch: break
+            for kind, url in batch:
+                if kind == "category":
+                    self.crawl_category(url)
+                else:
+                    self.scrape_detail(url)
+                    time.sleep(self.delay)
+            if not self.checkpoint(): break
+        self.finish()
+
+    def fetch_all_async(self):
+        """asyncioで並列にクロールする（結果のstations行はfetch_allと同じ）"""
+        from async_crawler import AsyncWikiCrawler
+        self.seed()
+        crawler = AsyncWikiCrawler(self, concurrency=self.concurrency, rate_per_sec=self.rate_per_sec,
+                                   transport=self.transport)
+        asyncio.run(crawler.run())
+        self.finish()
+
+    def fetch_all_pipeline(self, parse_workers=4):
+        """取得・解析（プロセスプール）・保存を別ステージで動かすモード"""
+        from pipeline import PipelineCrawler
+        self.seed()
+        crawler = PipelineCrawler(self, concurrency=self.concurrency, rate_per_sec=self.rate_per_sec,
+                                  transport=self.transport, parse_workers=parse_workers,
+                                  backend=self.page_parser.name)
+        asyncio.run(crawler.run())
+        self.finish()
+
+    def fetch_all_api(self, api_url=None):
+        """MediaWiki API（categorymembers + 50件ずつの revisions）でまとめて取得するモード"""
+        from mediawiki_api import MediaWikiHarvester
+        # API モードはページキャッシュを通らないので、訪問済みの取り直しはしない
+        self.seed(revalidate=False)
+        harvester = MediaWikiHarvester(self, api_url=api_url, session=self.session)
+        harvester.run()
+        print(f"APIリクエスト数: {harvester.requests_made}")
+        self.finish()
+
+    def refresh(self, discover=True):
+        """リビジョンIDが変わった記事だけ取り直す（毎晩の更新用）"""
+        from refresh import IncrementalRefresher
+        summary = IncrementalRefresher(self, discover=discover).run()
+        self.metrics.set_rows(self.writer.stats())
+        self.refresh_views()
+        self.writer.close()
+        self.report_metrics()
+        return summary
+
+    def checkpoint(self):
+        """保存待ちの行を書き出してから、フロンティアの状態を確定する
+
+        書き出しに失敗したら、前回のチェックポイント以降のフロンティアの変更を取り消して False を返す
+        （その間に visited にしたページは pending に戻り、次に実行したときに取り直す）。
+        """
+        try:
+            with self.metrics.stage("flush"):
+                self.writer.flush()
+        except Exception as e:
+            return self.rollback_checkpoint(e)
+        return self.commit_checkpoint()
+
+    def commit_checkpoint(self):
+        self.frontier.commit()
+        self.metrics.set_frontier(self.frontier.counts())
+        self.metrics.set_rows(self.writer.stats())
+        return True
+
+    def rollback_checkpoint(self, error):
+        self.frontier.rollback()
+        self.save_failed = True
+        self.metrics.set_rows(self.writer.stats())
+        print(f"      [!] 保存に失敗したので、前回のチェックポイント以降のクロール状態を取り消しました: {error}")
+        return False
+
+    def finish(self):
+        """残りのバッファを書き出して、保存件数を表示する"""
+        self.checkpoint()
+        if not self.save_failed:
+            self.refresh_views()
+        self.writer.close()
+        counts = self.frontier.counts()
+        if self.cache:
+            cs = self.cache.stats()
+            print(f"キャッシュ: ヒット率 {cs['hit_rate']:.1%} (ローカル {cs['hits']}件 / 304 {cs['revalidated']}件 / 取得 {cs['misses']}件)")
+            self.cache.close()
+        print(f"フロンティア: 訪問済み {counts['visited']}件 / 失敗 {counts['failed']}件 / 未訪問 {counts['pending'] + counts['claimed']}件")
+        if self.save_failed:
+            print("      [!] 保存に失敗したので途中で止めました（次に実行すると未訪問の分から再開します）")
+        st = self.writer.stats()
+        print(f"保存: {st['written']}件 / 更新: {st['updated']}件 / 重複: {st['deduplicated']}件 / 失敗: {st['failed']}件 ({st['batches']}バッチ)")
+        self.report_metrics()
+
+    def report_metrics(self):
+        self.metrics.summary()
+        if self.exporter:
+            self.exporter.stop()
+
+    def refresh_views(self):
+        """保存し終えたら、分析用のマテリアライズドビューを更新する"""
+        try:
+            with self.metrics.stage("views"):
+                self.writer.refresh_views()
+        except Exception as e:
+            print(f"      [!] 集計ビューの更新に失敗: {e}")
+
+    def fetch_html(self, url):
+        """ページを取得する（キャッシュがあれば If-None-Match / If-Modified-Since で再検証する）"""
+        with self.metrics.stage("fetch"):
+            if self.cache is None:
+                res = self.session.get(url, timeout=10)
+                check_status(res)
+                return res.text
+            entry = self.cache.lookup(url)
+            if entry and self.cache.is_fresh(entry):
+                return self.cache.serve_fresh(url, entry)
+            res = self.session.get(url, headers=self.cache.conditional_headers(entry), timeout=10)
+            if not (res.status_code == 304 and entry is not None):
+                check_status(res)
+            return self.cache.handle_response(url, entry, res.status_code, res.text, res.headers)
 
     def crawl_category(self, url):
-        # 重複・空URLチェック（ここでエラーを回避）
-        if not url or url in self.processed_urls: return
-        self.processed_urls.add(url)
-        
-        
         try:
-            res = requests.get(url, headers=self.headers, timeout=10)
-            soup = BeautifulSoup(res.text, 'html.parser')
-
-            # 1. 駅ページを解析
-            links = soup.select("#mw-pages .mw-category-group a")
-            for link in links:
-                href = link.get('href')
-                if href and "駅" in link.text and "Category" not in href:
-                    self.scrape_detail(self.base_url + href)
-                    time.sleep(0.2)
-
-            # 2. サブカテゴリ（足立区の鉄道など）を探索
-            sub_cats = soup.select("#mw-subcategories .mw-category-group a")
-            for sub_cat in sub_cats:
-                sub_href = sub_cat.get('href')
-                if sub_href: # ここで None をチェック！
-                    self.crawl_category(self.base_url + sub_href)
-
-            # 3. 「次の200件」を追跡
-            next_link = soup.find("a", string="次の200件")
-            if next_link and next_link.get('href'):
-                self.crawl_category(self.base_url + next_link.get('href'))
+            self.expand_category(url, self.fetch_html(url))
         except Exception as e:
+            self.mark_failed(url, e)
             print(f"      [!] カテゴリ取得失敗: {e}")
 
+    def expand_category(self, url, html):
+        """カテゴリページの中身をフロンティアに積む（重複URLは frontier 側で無視される）"""
+        station_urls, sub_cat_urls, next_url = self.parse_category(html)
+        # 1. 駅ページ
+        self.frontier.add_many(station_urls, "station")
+        # 2. サブカテゴリ（足立区の鉄道など）
+        self.frontier.add_many(sub_cat_urls, "category")
+        # 3. 「次の200件」
+        if next_url:
+            self.frontier.add(next_url, "category")
+        self.frontier.mark_visited(url)
+
+    def parse_category(self, html):
+        """カテゴリページから (駅ページURL, サブカテゴリURL, 次の200件URL) を取り出す"""
+        with self.metrics.stage("parse"):
+            return self.page_parser.parse_category(html, self.base_url)
+
     def scrape_detail(self, url):
         try:
-            res = requests.get(url, headers=self.headers, timeout=10)
-            soup = BeautifulSoup(res.text, 'html.parser')
-            st_name = soup.find("h1", id="firstHeading").text.replace("駅", "")
-            
-            content = soup.find("div", class_="mw-parser-output")
-            paragraphs = content.find_all("p")
-            
-            lines, comp, loc = [], "不明", "不明"
-            for p in paragraphs:
-                text = p.get_text()
-                if "駅" in text and ("は" in text or "にある" in text):
-                    lines = [l.text for l in p.find_all("a", title=lambda x: x and "線" in x)]
-                    c_link = p.find("a", title=lambda x: x and ("鉄道" in x or "交通局" in x))
-                    if c_link: comp = c_link.text
-                    t_link = p.find("a", title="東京都")
-                    if t_link:
-                        loc_link = t_link.find_next_sibling("a")
-                        if loc_link: loc = loc_link.text
-                    break
-
-            for ln in (lines if lines else ["不明"]):
-                self.save_db(st_name, ln, comp, loc)
-        except: pass
+            html = self.fetch_html(url)
+            self.save_page(url, extract_revision_id(html), self.parse_detail(html))
+            self.frontier.mark_visited(url)
+        except Exception as e:
+            self.mark_failed(url, e)
+
+    def mark_failed(self, url, error):
+        """フロンティアで failed にして、あきらめたページとして数える"""
+        self.frontier.mark_failed(url, error)
+        self.metrics.page_failed()
+
+    def parse_detail(self, html):
+        """駅ページから (駅名, 路線名, 会社名, 所在地) の行リストを作る"""
+        with self.metrics.stage("parse"):
+            return self.page_parser.parse_detail(html)
+
+    def save_page(self, url, rev_id, rows):
+        """1記事分の行を保存する（記事のリビジョンIDと取得時刻も記録される）"""
+        with self.metrics.stage("save"):
+            self.writer.add_page(url_to_title(url), rev_id, rows)
 
     def save_db(self, st, ln, cp, lc):
-        try:
-            with psycopg2.connect(**self.db_params) as conn:
-                with conn.cursor() as cur:
-                    # 重複防止
-                    cur.execute("""
-                        INSERT INTO stations (station_name, line_name, company_name, location)
-                        VALUES (%s, %s, %s, %s)
-                        ON CONFLICT (station_name, line_name) DO NOTHING;
-                    """, (st, ln, cp, lc))
-                conn.commit()
-            print(f"      [SUCCESS] {st} ({ln})")
-        except: pass
+        # 重複防止は StationWriter 側の ON CONFLICT DO NOTHING で行う
+        self.writer.add(st, ln, cp, lc)
 
 if __name__ == "__main__":
-    scraper = WikiScraperPostgres()
-    scraper.fetch_all()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Wikipediaから東京都の駅データを収集する")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="asyncioで並列にクロールする")
+    parser.add_argument("--source", choices=["html", "api"], default="html", help="記事HTMLを取るか MediaWiki API でまとめて取るか")
+    parser.add_argument("--base-url", default="https://ja.wikipedia.org", help="Wikiのベース URL（スタブサーバーを使うときに変える）")
+    parser.add_argument("--refresh", action="store_true", help="リビジョンIDが変わった記事だけ取り直す")
+    parser.add_argument("--no-discover", action="store_true", help="差分更新のときにカテゴリをたどって新しい記事を探さない")
+    parser.add_argument("--pipeline", action="store_true", help="解析をプロセスプールに分けたパイプラインでクロールする")
+    parser.add_argument("--parse-workers", type=int, default=4, help="解析プロセス数（パイプラインモード）")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時リクエスト数（非同期モード）")
+    parser.add_argument("--rate", type=float, default=5.0, help="1ホストあたりの毎秒リクエスト数（非同期モード）")
+    parser.add_argument("--batch-size", type=int, default=500, help="まとめて書き込む行数")
+    parser.add_argument("--write-method", choices=["values", "copy"], default="values", help="バッチ書き込みの方式")
+    parser.add_argument("--frontier", default="crawl_frontier.db", help="クロール状態を保存する SQLite ファイル")
+    parser.add_argument("--cache-dir", default="http_cache", help="ページキャッシュの保存先")
+    parser.add_argument("--no-cache", action="store_true", help="ページキャッシュを使わない")
+    parser.add_argument("--cache-max-age", type=float, default=0, help="この秒数以内に取ったページは再検証せずに使う")
+    parser.add_argument("--parser", choices=["bs4", "lxml"], default="bs4", help="HTML解析の実装")
+    parser.add_argument("--record", help="取得したレスポンスをこの zip に記録する（キャッシュは使わない）")
+    parser.add_argument("--replay", help="記録した zip からページを返す（ネットには出ない）")
+    parser.add_argument("--replay-latency", type=float, default=0.0, help="再生時に1リクエストごとに入れる遅延（秒）")
+    parser.add_argument("--metrics-file", help="ステージ別メトリクスを Prometheus のテキスト形式で書き出すファイル")
+    parser.add_argument("--metrics-interval", type=float, default=15.0, help="メトリクスファイルを書き出す間隔（秒）")
+    parser.add_argument("--fresh", action="store_true", help="保存済みのクロール状態を消して最初から始める")
+    parser.add_argument("--retry-failed", action="store_true", help="前回失敗したURLをもう一度取りに行く")
+    args = parser.parse_args()
+
+    scraper = WikiScraperPostgres(concurrency=args.concurrency, rate_per_sec=args.rate,
+                                  batch_size=args.batch_size, write_method=args.write_method,
+                                  frontier_path=args.frontier,
+                                  cache_dir=None if args.no_cache or args.record or args.replay else args.cache_dir,
+                                  cache_max_age=args.cache_max_age, parser_backend=args.parser,
+                                  base_url=args.base_url)
+    archive = None
+    if args.record:
+        from replay import ReplayArchive
+        archive = ReplayArchive(args.record, "w", base_url=args.base_url)
+        scraper.record_to(archive)
+    elif args.replay:
+        from replay import ReplayArchive
+        archive = ReplayArchive(args.replay)
+        scraper.use_replay(archive, args.replay_latency)
+    if args.metrics_file:
+        scraper.export_metrics(args.metrics_file, args.metrics_interval)
+    if args.fresh:
+        scraper.frontier.reset()
+    if args.retry_failed:
+        scraper.frontier.retry_failed()
+    if args.refresh:
+        scraper.refresh(discover=not args.no_discover)
+    elif args.source == "api":
+        scraper.fetch_all_api()
+    elif args.pipeline:
+        scraper.fetch_all_pipeline(parse_workers=args.parse_workers)
+    elif args.use_async:
+        scraper.fetch_all_async()
+    else:
+        scraper.fetch_all()
+    if archive:
+        archive.close()
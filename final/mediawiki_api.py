@@ -0,0 +1,221 @@
+import html
+import re
+import time
+from urllib.parse import quote, unquote
+
+# 1回の prop=revisions で指定できるタイトル数の上限
+MAX_TITLES = 50
+
+FILE_PREFIXES = ("ファイル:", "画像:", "File:", "Image:")
+CATEGORY_PREFIXES = ("Category:", "カテゴリ:")
+
+_link_re = re.compile(r"\[\[([^\[\]|]+)(?:\|([^\[\]]*))?\]\]")
+_ext_link_re = re.compile(r"\[(?:https?:)?//[^\s\]]+(?:\s+([^\]]*))?\]")
+_ref_re = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.S | re.I)
+_comment_re = re.compile(r"<!--.*?-->", re.S)
+_template_re = re.compile(r"\{\{[^{}]*\}\}")
+_table_re = re.compile(r"\{\|[^{}]*?\|\}", re.S)
+_tag_re = re.compile(r"</?(?:span|small|br|sup|sub|nowiki)[^>]*>", re.I)
+
+
+def title_to_url(base_url, title):
+    return base_url + "/wiki/" + quote(title.replace(" ", "_"), safe="/:(),!*;@$~")
+
+
+def url_to_title(url):
+    path = url.split("/wiki/", 1)[1]
+    return unquote(path).replace("_", " ")
+
+
+def _resolve(title, rename):
+    # normalized → redirects の順に名前が変わることがあるので数回たどる
+    for _ in range(3):
+        if title not in rename: break
+        title = rename[title]
+    return title
+
+
+def _strip_nested(text, pattern):
+    # 入れ子のテンプレートは内側から消していく
+    while True:
+        new = pattern.sub("", text)
+        if new == text: return new
+        text = new
+
+
+def _strip_prefixed_links(text, prefixes):
+    """[[ファイル:...]] のような、中にリンクを含むかもしれないリンクを丸ごと消す"""
+    out, i = [], 0
+    while i < len(text):
+        if text.startswith("[[", i) and text[i + 2:].lstrip(":").startswith(prefixes):
+            depth, j = 0, i
+            while j < len(text):
+                if text.startswith("[[", j): depth += 1; j += 2
+                elif text.startswith("]]", j):
+                    depth -= 1; j += 2
+                    if depth == 0: break
+                else: j += 1
+            i = j
+        else:
+            out.append(text[i]); i += 1
+    return "".join(out)
+
+
+def _link_to_html(m):
+    target = m.group(1).strip().lstrip(":").split("#", 1)[0].replace("_", " ")
+    label = m.group(2) if m.group(2) is not None else m.group(1)
+    return f'<a href="/wiki/{quote(target.replace(" ", "_"))}" title="{html.escape(target)}">{html.escape(label)}</a>'
+
+
+def wikitext_to_html(title, wikitext):
+    """リード部分（最初の見出しより前）のウィキテキストを、scrape_detail が読める最小限のHTMLにする
+
+    テンプレート・脚注・表・画像は捨てて、段落とリンク（title属性）だけを残す。
+    これで HTML モードと同じ page_parser の抽出処理をそのまま使える。
+    """
+    lead = re.split(r"^==", wikitext, maxsplit=1, flags=re.M)[0]
+    lead = _comment_re.sub("", lead)
+    lead = _ref_re.sub("", lead)
+    lead = _strip_nested(lead, _template_re)
+    lead = _strip_nested(lead, _table_re)
+    lead = _strip_prefixed_links(lead, FILE_PREFIXES + CATEGORY_PREFIXES)
+    lead = _tag_re.sub("", lead)
+    lead = lead.replace("'''", "").replace("''", "")
+
+    paragraphs = []
+    for block in re.split(r"\n\s*\n", lead):
+        lines = [l for l in block.strip().splitlines()
+                 if l.strip() and not l.lstrip().startswith(("*", "#", ":", ";", "|", "!", "__"))]
+        if not lines: continue
+        text = " ".join(l.strip() for l in lines)
+        text = _ext_link_re.sub(lambda m: m.group(1) or "", text)
+        # リンク以外の部分だけエスケープする
+        parts, last = [], 0
+        for m in _link_re.finditer(text):
+            parts.append(html.escape(text[last:m.start()]))
+            parts.append(_link_to_html(m))
+            last = m.end()
+        parts.append(html.escape(text[last:]))
+        paragraphs.append("<p>" + "".join(parts) + "</p>")
+
+    return (f'<h1 id="firstHeading">{html.escape(title)}</h1>'
+            f'<div class="mw-parser-output">{"".join(paragraphs)}</div>')
+
+
+class MediaWikiHarvester:
+    """MediaWiki API でカテゴリと記事をまとめて取得するモード
+
+    カテゴリは list=categorymembers（continue で続きを取る）、記事本文は
+    prop=revisions で最大50件ずつ取得する。フロンティアのキーは HTML モードと同じ
+    記事URLなので、再開やキャッシュの考え方もそのまま使える。
+    """
+
+    def __init__(self, scraper, api_url=None, batch_size=MAX_TITLES, delay=None, session=None):
+        self.scraper = scraper
+        self.frontier = scraper.frontier
+        self.api_url = api_url or scraper.base_url + "/w/api.php"
+        self.batch_size = min(batch_size, MAX_TITLES)
+        # リクエストごとの待ち時間（指定がなければ HTML モードと同じ scraper.delay）
+        self.delay = scraper.delay if delay is None else delay
+        self.session = session or scraper.session
+        self.requests_made = 0
+
+    def api(self, **params):
+        params.update({"format": "json", "formatversion": "2"})
+        with self.scraper.metrics.stage("fetch"):
+            res = self.session.get(self.api_url, params=params, timeout=30)
+            res.raise_for_status()
+            data = res.json()
+        self.requests_made += 1
+        if self.delay: time.sleep(self.delay)
+        return data
+
+    def run(self):
+        while True:
+            batch = self.frontier.next_batch(self.batch_size * 4)
+            if not batch: break
+            stations = []
+            for kind, url in batch:
+                if kind == "category":
+                    self.harvest_category(url)
+                else:
+                    stations.append(url)
+            for i in range(0, len(stations), self.batch_size):
+                self.harvest_pages(stations[i:i + self.batch_size])
+            if not self.scraper.checkpoint(): break
+
+    def category_members(self, title):
+        """カテゴリのメンバーを continue を追いながら全部返す"""
+        params = {"action": "query", "list": "categorymembers", "cmtitle": title,
+                  "cmtype": "page|subcat", "cmlimit": "max"}
+        while True:
+            data = self.api(**params)
+            yield from data.get("query", {}).get("categorymembers", [])
+            if "continue" not in data: return
+            params.update(data["continue"])
+
+    def harvest_category(self, url):
+        base = self.scraper.base_url
+        try:
+            station_urls, sub_cat_urls = [], []
+            for member in self.category_members(url_to_title(url)):
+                if member["ns"] == 14:
+                    sub_cat_urls.append(title_to_url(base, member["title"]))
+                elif member["ns"] == 0 and "駅" in member["title"]:
+                    station_urls.append(title_to_url(base, member["title"]))
+            self.frontier.add_many(station_urls, "station")
+            self.frontier.add_many(sub_cat_urls, "category")
+            self.frontier.mark_visited(url)
+        except Exception as e:
+            self.scraper.mark_failed(url, e)
+            print(f"      [!] カテゴリ取得失敗: {e}")
+
+    def fetch_pages(self, titles):
+        """タイトルのリストから {要求したタイトル: ページ情報} を返す（正規化・リダイレクトも追う）"""
+        data = self.api(action="query", prop="revisions", rvprop="ids|timestamp|content",
+                        rvslots="main", redirects="1", titles="|".join(titles))
+        query = data.get("query", {})
+        rename = {item["from"]: item["to"] for item in query.get("normalized", []) + query.get("redirects", [])}
+        pages = {p["title"]: p for p in query.get("pages", [])}
+        return {title: pages.get(_resolve(title, rename)) for title in titles}
+
+    def harvest_pages(self, urls):
+        titles = {url_to_title(u): u for u in urls}
+        try:
+            pages = self.fetch_pages(list(titles))
+        except Exception as e:
+            for url in urls:
+                self.scraper.mark_failed(url, e)
+            print(f"      [!] 記事取得失敗 ({len(urls)}件): {e}")
+            return
+
+        for title, url in titles.items():
+            try:
+                rev_id, rows = self.page_rows(pages.get(title))
+                self.scraper.save_page(url, rev_id, rows)
+                self.frontier.mark_visited(url)
+            except Exception as e:
+                self.scraper.mark_failed(url, e)
+
+    def page_rows(self, page):
+        """prop=revisions の1ページ分から (リビジョンID, 行リスト) を作る"""
+        if not page or page.get("missing") or not page.get("revisions"):
+            raise ValueError("記事がありません")
+        rev = page["revisions"][0]
+        html_text = wikitext_to_html(page["title"], rev["slots"]["main"]["content"])
+        return rev["revid"], self.scraper.parse_detail(html_text)
+
+    def latest_revisions(self, titles):
+        """prop=info で {タイトル: 最新リビジョンID} を50件ずつまとめて取る（消えた記事は None）"""
+        result = {}
+        titles = list(titles)
+        for i in range(0, len(titles), self.batch_size):
+            chunk = titles[i:i + self.batch_size]
+            data = self.api(action="query", prop="info", redirects="1", titles="|".join(chunk))
+            query = data.get("query", {})
+            rename = {item["from"]: item["to"] for item in query.get("normalized", []) + query.get("redirects", [])}
+            pages = {p["title"]: p for p in query.get("pages", [])}
+            for title in chunk:
+                page = pages.get(_resolve(title, rename))
+                result[title] = None if not page or page.get("missing") else page.get("lastrevid")
+        return result
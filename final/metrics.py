@@ -0,0 +1,219 @@
+import asyncio
+import bisect
+import os
+import threading
+import time
+from collections import Counter
+
+# 秒単位のヒストグラムの境界（Prometheus の le）
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """固定バケットのレイテンシヒストグラム（観測は二分探索1回と加算だけ）"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """バケット内を線形補間した分位点の目安"""
+        if self.count == 0: return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        if exc_type is None:
+            self.metrics.observe(self.stage, elapsed)
+        else:
+            self.metrics.fail(self.stage, exc)
+        return False
+
+
+class CrawlMetrics:
+    """クロールのステージ別レイテンシ・件数・失敗理由・フロンティアの大きさを集める
+
+    with metrics.stage("parse"): ... のように囲むと、成功ならその時間をヒストグラムに、
+    例外なら (ステージ, 例外クラス名) を失敗として数える（例外はそのまま外に出す）。
+    ステージの失敗はリトライや取り直しでも増えるので、あきらめたページ数は page_failed() で別に数える。
+    保存は別スレッドから呼ばれるのでロックを取る。
+    """
+
+    STAGES = ("connect", "fetch", "parse", "save", "flush")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: Histogram() for name in self.STAGES}
+        self.failures = Counter()
+        self.pages_failed = 0
+        self.gauges = {}
+        self.rows = {}
+        self.connecting = {}
+        self.started = time.time()
+
+    def stage(self, name):
+        return _StageTimer(self, name)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = Histogram()
+            hist.observe(seconds)
+
+    def fail(self, stage, exc):
+        with self.lock:
+            self.failures[(stage, type(exc).__name__)] += 1
+
+    def page_failed(self):
+        """ページを failed にしたときに呼ぶ"""
+        with self.lock:
+            self.pages_failed += 1
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def set_frontier(self, counts):
+        for state, n in counts.items():
+            self.gauges[("frontier", state)] = n
+
+    def set_rows(self, stats):
+        """writer.stats() の行数（保存・更新・重複・失敗）"""
+        self.rows = {result: stats[result] for result in ("written", "updated", "deduplicated", "failed")}
+
+    async def httpx_trace(self, event, info):
+        """httpx の trace 拡張に渡すと、接続（DNS解決 + TCP + TLS）の時間を connect に記録する"""
+        if not event.startswith("connection.connect_tcp."): return
+        # info は接続関数の引数そのものなので書き込まず、タスクごとに開始時刻を持つ
+        task = asyncio.current_task()
+        if event.endswith(".started"):
+            self.connecting[task] = time.perf_counter()
+            return
+        started = self.connecting.pop(task, None)
+        if event.endswith(".complete") and started is not None:
+            self.observe("connect", time.perf_counter() - started)
+        elif event.endswith(".failed"):
+            self.fail("connect", info.get("exception") or Exception())
+
+    def render_prometheus(self):
+        """Prometheus のテキスト形式（node_exporter の textfile collector で読める）"""
+        lines = ["# HELP wiki_crawl_stage_seconds Latency of each crawl stage.",
+                 "# TYPE wiki_crawl_stage_seconds histogram"]
+        with self.lock:
+            for name, hist in self.histograms.items():
+                cumulative = 0
+                for le, n in zip(hist.buckets, hist.counts):
+                    cumulative += n
+                    lines.append(f'wiki_crawl_stage_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'wiki_crawl_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'wiki_crawl_stage_seconds_sum{{stage="{name}"}} {hist.sum:.6f}')
+                lines.append(f'wiki_crawl_stage_seconds_count{{stage="{name}"}} {hist.count}')
+            lines += ["# HELP wiki_crawl_pages_total Pages fetched, parsed and given up on; saved is rows the writer wrote.",
+                      "# TYPE wiki_crawl_pages_total counter"]
+            for result, stage in (("fetched", "fetch"), ("parsed", "parse")):
+                lines.append(f'wiki_crawl_pages_total{{result="{result}"}} {self.histograms[stage].count}')
+            # save ステージは writer に渡した時点で終わるので、書き出せたかは writer の集計で見る
+            lines.append(f'wiki_crawl_pages_total{{result="saved"}} {self.rows.get("written", 0)}')
+            lines.append(f'wiki_crawl_pages_total{{result="failed"}} {self.pages_failed}')
+            lines += ["# HELP wiki_crawl_failures_total Failures by stage and exception type.",
+                      "# TYPE wiki_crawl_failures_total counter"]
+            for (stage, reason), n in sorted(self.failures.items()):
+                lines.append(f'wiki_crawl_failures_total{{stage="{stage}",reason="{reason}"}} {n}')
+        lines += ["# HELP wiki_crawl_rows_total Station rows handed to the writer, by result.",
+                  "# TYPE wiki_crawl_rows_total counter"]
+        for result, n in dict(self.rows).items():
+            lines.append(f'wiki_crawl_rows_total{{result="{result}"}} {n}')
+        lines += ["# HELP wiki_crawl_frontier_urls URLs in the crawl frontier by state.",
+                  "# TYPE wiki_crawl_frontier_urls gauge"]
+        gauges = dict(self.gauges)
+        for key, value in gauges.items():
+            if isinstance(key, tuple):
+                lines.append(f'wiki_crawl_frontier_urls{{state="{key[1]}"}} {value}')
+        for key, value in gauges.items():
+            if not isinstance(key, tuple):
+                lines += [f"# TYPE wiki_crawl_{key} gauge", f"wiki_crawl_{key} {value}"]
+        lines += ["# TYPE wiki_crawl_start_time_seconds gauge", f"wiki_crawl_start_time_seconds {self.started:.0f}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # 読み手が途中まで書かれたファイルを見ないように、一時ファイルから置き換える
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)
+
+    def summary(self):
+        """実行の最後に出すステージ別の集計"""
+        elapsed = time.time() - self.started
+        print(f"ステージ別 (経過 {elapsed:.1f}秒):")
+        with self.lock:
+            for name, hist in self.histograms.items():
+                failed = sum(n for (stage, _), n in self.failures.items() if stage == name)
+                if hist.count == 0 and failed == 0: continue
+                mean = hist.sum / hist.count if hist.count else 0.0
+                print(f"  {name:<8} {hist.count:>6}件  失敗 {failed:>4}件  合計 {hist.sum:7.2f}秒"
+                      f"  平均 {mean * 1000:7.1f}ms  p50 {hist.quantile(0.5) * 1000:7.1f}ms"
+                      f"  p99 {hist.quantile(0.99) * 1000:7.1f}ms")
+            for (stage, reason), n in self.failures.most_common(5):
+                print(f"  失敗理由: {stage} / {reason}: {n}件")
+        if self.pages_failed:
+            print(f"  取得できなかったページ: {self.pages_failed}件")
+        if self.rows.get("failed"):
+            print(f"  保存できなかった行: {self.rows['failed']}件")
+
+
+class MetricsExporter:
+    """別スレッドで interval 秒ごとに Prometheus のテキストファイルを書き出す"""
+
+    def __init__(self, metrics, path, interval=15.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            self.metrics.write_prometheus(self.path)
+        except OSError as e:
+            print(f"      [!] メトリクスを書き出せませんでした: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.write()
@@ -0,0 +1,190 @@
+import re
+
+from bs4 import BeautifulSoup
+
+NEXT_PAGE_TEXT = "次の200件"
+
+_revision_re = re.compile(r'"wgRevisionId"\s*:\s*(\d+)')
+
+
+def extract_revision_id(html):
+    """記事HTMLの mw.config（wgRevisionId）からリビジョンIDを取り出す（なければ None）"""
+    m = _revision_re.search(html)
+    return int(m.group(1)) if m else None
+
+
+def is_lead_paragraph(text):
+    """駅の概要（最初の説明段落）かどうか"""
+    return "駅" in text and ("は" in text or "にある" in text)
+
+
+class Bs4PageParser:
+    """BeautifulSoup(html.parser) でページ全体を組み立てて解析する（従来の処理）"""
+
+    name = "bs4"
+
+    def parse_category(self, html, base_url):
+        soup = BeautifulSoup(html, 'html.parser')
+
+        station_urls = []
+        for link in soup.select("#mw-pages .mw-category-group a"):
+            href = link.get('href')
+            if href and "駅" in link.text and "Category" not in href:
+                station_urls.append(base_url + href)
+
+        sub_cat_urls = []
+        for sub_cat in soup.select("#mw-subcategories .mw-category-group a"):
+            sub_href = sub_cat.get('href')
+            if sub_href: # ここで None をチェック！
+                sub_cat_urls.append(base_url + sub_href)
+
+        next_url = None
+        next_link = soup.find("a", string=NEXT_PAGE_TEXT)
+        if next_link and next_link.get('href'):
+            next_url = base_url + next_link.get('href')
+        return station_urls, sub_cat_urls, next_url
+
+    def parse_detail(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+        st_name = soup.find("h1", id="firstHeading").text.replace("駅", "")
+
+        content = soup.find("div", class_="mw-parser-output")
+        paragraphs = content.find_all("p")
+
+        lines, comp, loc = [], "不明", "不明"
+        for p in paragraphs:
+            text = p.get_text()
+            if is_lead_paragraph(text):
+                lines = [l.text for l in p.find_all("a", title=lambda x: x and "線" in x)]
+                c_link = p.find("a", title=lambda x: x and ("鉄道" in x or "交通局" in x))
+                if c_link: comp = c_link.text
+                t_link = p.find("a", title="東京都")
+                if t_link:
+                    loc_link = t_link.find_next_sibling("a")
+                    if loc_link: loc = loc_link.text
+                break
+
+        return [(st_name, ln, comp, loc) for ln in (lines if lines else ["不明"])]
+
+
+class LxmlPageParser:
+    """lxml で必要な部分だけを解析する高速版
+
+    駅ページは div.mw-parser-output の開始位置から少しずつ HTMLPullParser に流し込み、
+    最初に見つかった概要段落で打ち切る。見出しは <h1 id="firstHeading"> の部分だけを解析する。
+    取り出す値は Bs4PageParser と同じになるようにしている。
+    """
+
+    name = "lxml"
+    chunk_size = 16 * 1024
+    # bs4 の get_text() はこれらのタグの中身を含めない
+    skip_text_tags = ("script", "style", "template")
+
+    _heading_re = re.compile(r'<h1\b[^>]*\bid=["\']firstHeading["\'][^>]*>(.*?)</h1\s*>', re.S | re.I)
+    _content_re = re.compile(r'<div\b[^>]*\bclass=["\'][^"\']*\bmw-parser-output\b', re.I)
+
+    def __init__(self):
+        from lxml import etree, html as lxml_html
+        self.etree = etree
+        self.lxml_html = lxml_html
+
+    def _text(self, el):
+        parts = []
+        self._collect_text(el, parts)
+        return "".join(parts)
+
+    def _collect_text(self, el, parts):
+        if el.text and el.tag not in self.skip_text_tags:
+            parts.append(el.text)
+        for child in el:
+            if isinstance(child.tag, str):
+                self._collect_text(child, parts)
+            if child.tail:
+                parts.append(child.tail)
+
+    def parse_category(self, html, base_url):
+        root = self.lxml_html.fromstring(html)
+
+        station_urls = []
+        for link in root.xpath('//*[@id="mw-pages"]//*[contains(concat(" ", normalize-space(@class), " "), " mw-category-group ")]//a'):
+            href = link.get('href')
+            if href and "駅" in self._text(link) and "Category" not in href:
+                station_urls.append(base_url + href)
+
+        sub_cat_urls = []
+        for sub_cat in root.xpath('//*[@id="mw-subcategories"]//*[contains(concat(" ", normalize-space(@class), " "), " mw-category-group ")]//a'):
+            sub_href = sub_cat.get('href')
+            if sub_href:
+                sub_cat_urls.append(base_url + sub_href)
+
+        next_url = None
+        for a in root.iter("a"):
+            # bs4 の string= は子要素がなく、文字列が完全一致するときだけ当たる
+            if len(a) == 0 and a.text == NEXT_PAGE_TEXT:
+                if a.get('href'):
+                    next_url = base_url + a.get('href')
+                break
+        return station_urls, sub_cat_urls, next_url
+
+    def parse_detail(self, html):
+        m = self._heading_re.search(html)
+        if m is None:
+            raise ValueError("firstHeading が見つかりません")
+        heading = self.lxml_html.fragment_fromstring(m.group(1), create_parent="div")
+        st_name = self._text(heading).replace("駅", "")
+
+        lead = self._find_lead_paragraph(html)
+
+        lines, comp, loc = [], "不明", "不明"
+        if lead is not None:
+            links = [a for a in lead.iter("a")]
+            lines = [self._text(a) for a in links if a.get("title") and "線" in a.get("title")]
+            for a in links:
+                title = a.get("title")
+                if title and ("鉄道" in title or "交通局" in title):
+                    comp = self._text(a)
+                    break
+            for a in links:
+                if a.get("title") == "東京都":
+                    for sib in a.itersiblings():
+                        if sib.tag == "a":
+                            loc = self._text(sib)
+                            break
+                    break
+
+        return [(st_name, ln, comp, loc) for ln in (lines if lines else ["不明"])]
+
+    def _find_lead_paragraph(self, html):
+        m = self._content_re.search(html)
+        if m is None:
+            raise ValueError("mw-parser-output が見つかりません")
+
+        parser = self.etree.HTMLPullParser(events=("start", "end"))
+        content = None
+        pos = m.start()
+        while pos < len(html):
+            parser.feed(html[pos:pos + self.chunk_size])
+            pos += self.chunk_size
+            for event, el in parser.read_events():
+                if content is None:
+                    if event == "start" and el.tag == "div":
+                        content = el
+                    continue
+                if event != "end": continue
+                if el is content:
+                    return None
+                if el.tag == "p" and is_lead_paragraph(self._text(el)):
+                    return el
+        return None
+
+
+PARSERS = {
+    "bs4": Bs4PageParser,
+    "lxml": LxmlPageParser,
+}
+
+
+def get_parser(name):
+    if name not in PARSERS:
+        raise ValueError(f"不明なパーサー: {name}（{', '.join(PARSERS)} から選んでください）")
+    return PARSERS[name]()
@@ -0,0 +1,118 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from async_crawler import AsyncWikiCrawler
+from page_parser import extract_revision_id, get_parser
+
+# 解析プロセスごとに1つだけ作るパーサー
+_worker_parser = None
+
+
+def _init_worker(backend):
+    global _worker_parser
+    _worker_parser = get_parser(backend)
+
+
+def _parse_in_worker(html):
+    return extract_revision_id(html), _worker_parser.parse_detail(html)
+
+
+class StageStats:
+    """ステージごとの処理件数とスループット"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+
+class PipelineCrawler(AsyncWikiCrawler):
+    """取得・解析・保存を別ステージに分けたクローラー
+
+    fetch ワーカーは駅ページの HTML を html_queue に積むだけにして、
+    解析は ProcessPoolExecutor に任せる（CPUを複数コア使う）。解析結果は
+    record_queue を通して保存ステージへ渡す。どちらのキューも上限付きなので、
+    後ろが詰まれば前のステージが待たされる（バックプレッシャー）。
+    """
+
+    def __init__(self, scraper, concurrency=8, rate_per_sec=5.0, transport=None,
+                 parse_workers=4, queue_size=64, report_interval=10.0, backend="bs4"):
+        super().__init__(scraper, concurrency=concurrency, rate_per_sec=rate_per_sec, transport=transport)
+        self.parse_workers = parse_workers
+        self.report_interval = report_interval
+        self.backend = backend
+        self.html_queue = asyncio.Queue(maxsize=queue_size)
+        self.record_queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = {name: StageStats(name) for name in ("fetch", "parse", "save")}
+
+    async def run(self):
+        pool = ProcessPoolExecutor(max_workers=self.parse_workers,
+                                   initializer=_init_worker, initargs=(self.backend,))
+        stages = [asyncio.create_task(self.parse_stage(pool)) for _ in range(self.parse_workers * 2)]
+        stages.append(asyncio.create_task(self.save_stage()))
+        reporter = asyncio.create_task(self.report_loop())
+        try:
+            # super().run() は claimed が残っている間は終わらないので、ここに来た時点で全ステージが空
+            await super().run()
+        finally:
+            for task in stages + [reporter]:
+                task.cancel()
+            await asyncio.gather(*stages, reporter, return_exceptions=True)
+            pool.shutdown()
+        self.report()
+
+    async def scrape_detail(self, client, url):
+        try:
+            html = await self.fetch(client, url)
+        except Exception as e:
+            self.stats["fetch"].failed += 1
+            self.scraper.mark_failed(url, e)
+            return
+        self.stats["fetch"].count += 1
+        await self.html_queue.put((url, html))
+
+    async def parse_stage(self, pool):
+        loop = asyncio.get_running_loop()
+        while True:
+            url, html = await self.html_queue.get()
+            try:
+                with self.metrics.stage("parse"):
+                    rev_id, rows = await loop.run_in_executor(pool, _parse_in_worker, html)
+                self.stats["parse"].count += 1
+                await self.record_queue.put((url, rev_id, rows))
+            except Exception as e:
+                self.stats["parse"].failed += 1
+                self.scraper.mark_failed(url, e)
+            finally:
+                self.html_queue.task_done()
+
+    async def save_stage(self):
+        while True:
+            url, rev_id, rows = await self.record_queue.get()
+            try:
+                async with self.saving():
+                    await asyncio.to_thread(self.scraper.save_page, url, rev_id, rows)
+                    self.frontier.mark_visited(url)
+                self.stats["save"].count += 1
+            except Exception as e:
+                self.stats["save"].failed += 1
+                self.scraper.mark_failed(url, e)
+            finally:
+                self.record_queue.task_done()
+
+    async def report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.report()
+
+    def report(self):
+        self.metrics.set_gauge("queue_html", self.html_queue.qsize())
+        self.metrics.set_gauge("queue_record", self.record_queue.qsize())
+        parts = [f"{s.name} {s.count}件 ({s.rate():.1f}/秒, 失敗 {s.failed})" for s in self.stats.values()]
+        print(f"  [pipeline] {' | '.join(parts)} | キュー html={self.html_queue.qsize()} record={self.record_queue.qsize()}")
@@ -0,0 +1,239 @@
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from analysis import StationAnalyzer
+
+DB_PARAMS = {"host": "localhost", "database": "dsprog2db", "user": "igarashiayaka", "password": ""}
+
+
+class _LRUCache:
+    """スレッドから共有する LRU キャッシュ（OrderedDict の末尾が最近使ったもの）"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {"size": len(self.items), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                    "hit_ratio": self.hits / total if total else 0.0}
+
+
+class QueryService:
+    """StationAnalyzer を読み込んだまま置いておき、区ごとの分析結果を LRU キャッシュから返す
+
+    watch_interval 秒ごとに stations のフィンガープリント（行数・最終保存時刻など）を確かめ、
+    変わっていたら StationAnalyzer を作り直してキャッシュを捨てる。
+    作り直している間も古い StationAnalyzer で答え続ける。
+    キャッシュのキーには世代番号を入れるので、作り直しの前に始まった問い合わせの結果が
+    あとから入っても新しい世代では使われない。
+    """
+
+    def __init__(self, make_analyzer, cache_size=1024, watch_interval=10.0):
+        self.make_analyzer = make_analyzer
+        self.analyzer = make_analyzer()
+        self.cache = _LRUCache(cache_size)
+        self.generation = 0
+        self.watch_interval = watch_interval
+        self.fingerprint = self.analyzer.fingerprint() if watch_interval else None
+        self.reloads = 0
+        self.stop_event = threading.Event()
+        self.watcher = None
+
+    def _entry(self, area_name):
+        generation, analyzer = self.generation, self.analyzer
+        key = (generation, area_name)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+        summary = analyzer.area_summary(area_name)
+        body = None
+        if summary is not None:
+            station_count, hubs = summary
+            body = {"area": area_name, "stations": station_count,
+                    "hubs": [[name, int(lines)] for name, lines in hubs.items()]}
+        # JSON にした結果も一緒に覚えておき、/area ではそのまま返す。
+        # 「データなし」も覚えておく（存在しない区を何度聞かれても DB に行かない）
+        entry = {"body": body, "json": json.dumps(body, ensure_ascii=False).encode("utf-8") if body else None}
+        self.cache.put(key, entry)
+        return entry
+
+    def area(self, area_name):
+        """区の分析結果（JSON にできる dict）。データがなければ None"""
+        return self._entry(area_name)["body"]
+
+    def area_json(self, area_name):
+        """area() を JSON にしたバイト列。データがなければ None"""
+        return self._entry(area_name)["json"]
+
+    def batch(self, area_names):
+        return {name: self.area(name) for name in area_names}
+
+    # --- 変更の検知 ---
+    def check(self):
+        """stations が変わっていたら作り直す。作り直したら True
+
+        確認や作り直しに失敗したときは古い世代のまま答え続け、次の確認でやり直す
+        （ここで例外を出すと watch() のスレッドが止まって、以後は更新されなくなる）。
+        """
+        try:
+            fingerprint = self.analyzer.fingerprint()
+            if fingerprint == self.fingerprint:
+                return False
+            analyzer = self.make_analyzer()
+        except Exception as e:
+            print(f"⚠️ stations を読み込み直せませんでした（古い結果のまま答えます）: {type(e).__name__}: {e}")
+            return False
+        self.analyzer, self.fingerprint = analyzer, fingerprint
+        self.generation += 1
+        self.cache.clear()
+        self.reloads += 1
+        print(f"🔄 stations が更新されたので読み込み直しました（世代 {self.generation}）")
+        return True
+
+    def start_watcher(self):
+        if not self.watch_interval: return
+        self.watcher = threading.Thread(target=self.watch, daemon=True)
+        self.watcher.start()
+
+    def watch(self):
+        while not self.stop_event.wait(self.watch_interval):
+            self.check()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.watcher is not None:
+            self.watcher.join()
+
+    def stats(self):
+        return {"generation": self.generation, "reloads": self.reloads, "fingerprint": self.fingerprint,
+                "cache": self.cache.stats()}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    # keep-alive で同じ接続から続けて問い合わせられるようにする
+    protocol_version = "HTTP/1.1"
+    # ヘッダーと本文を別々に書くので、Nagle を切らないと遅延 ACK と重なって 40ms 待たされる
+    disable_nagle_algorithm = True
+    service = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_json(self, status, data):
+        self.send_bytes(status, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def send_error_json(self, e):
+        # DB が落ちているときなど。接続を黙って切らずに 500 を返す
+        print(f"⚠️ 問い合わせに失敗しました: {type(e).__name__}: {e}")
+        self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def send_bytes(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/area":
+            if "name" not in params:
+                return self.send_json(400, {"error": "name を指定してください"})
+            try:
+                body = self.service.area_json(params["name"])
+            except Exception as e:
+                return self.send_error_json(e)
+            if body is None:
+                return self.send_json(404, {"error": f"{params['name']} のデータは見つかりませんでした。"})
+            return self.send_bytes(200, body)
+        if url.path == "/stats":
+            return self.send_json(200, self.service.stats())
+        self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/batch":
+            return self.send_json(404, {"error": "not found"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))))
+            areas = request["areas"]
+            if not isinstance(areas, list) or not all(isinstance(a, str) for a in areas):
+                raise TypeError("areas は文字列のリスト")
+        except (ValueError, KeyError, TypeError):
+            return self.send_json(400, {"error": '{"areas": ["大田区", ...]} の形で送ってください'})
+        try:
+            results = self.service.batch(areas)
+        except Exception as e:
+            return self.send_error_json(e)
+        self.send_json(200, {"results": results})
+
+
+def start_query_server(service, host="127.0.0.1", port=0):
+    """別スレッドでサーバーを立ち上げて (server, base_url) を返す"""
+    handler = type("BoundQueryHandler", (QueryHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    service.start_watcher()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def make_service(args):
+    if args.synthetic:
+        # DB なしで試すとき（変更の検知はしない）
+        from synth_stations import make_stations
+        df = make_stations(args.synthetic)
+        return QueryService(lambda: StationAnalyzer(None, df=df), args.cache_size, watch_interval=0)
+    kwargs = {"engine": args.engine} if args.engine == "sql" else {"snapshot_path": args.snapshot}
+    return QueryService(lambda: StationAnalyzer(DB_PARAMS, **kwargs), args.cache_size, args.watch_interval)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="StationAnalyzer を常駐させて HTTP/JSON で区ごとの分析結果を返す")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--engine", choices=["pandas", "sql"], default="pandas")
+    ap.add_argument("--snapshot", default="stations_snapshot.arrow", help="pandas モードで使うスナップショット")
+    ap.add_argument("--cache-size", type=int, default=1024, help="覚えておく区の結果の数")
+    ap.add_argument("--watch-interval", type=float, default=10.0, help="stations の変更を確かめる間隔（秒、0で確かめない）")
+    ap.add_argument("--synthetic", type=int, help="DB を使わずに、この行数の合成データで立ち上げる")
+    args = ap.parse_args()
+
+    start = time.perf_counter()
+    service = make_service(args)
+    server, base_url = start_query_server(service, port=args.port)
+    print(f"読み込み {time.perf_counter() - start:.1f}秒  サーバー起動: {base_url}  (Ctrl+C で終了)")
+    print(f"  GET {base_url}/area?name=大田区   POST {base_url}/batch {{\"areas\": [...]}}   GET {base_url}/stats")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        service.stop()
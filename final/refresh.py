@@ -0,0 +1,104 @@
+from collections import deque
+
+from mediawiki_api import MAX_TITLES, MediaWikiHarvester, title_to_url, url_to_title
+
+
+class IncrementalRefresher:
+    """記事のリビジョンIDを見て、変わった記事だけ取り直す差分更新
+
+    1. station_pages に記録済みの {記事: リビジョンID} を読む
+    2. （discover=True なら）categorymembers でカテゴリをたどって新しい記事も拾う
+    3. prop=info で最新リビジョンIDを50件ずつまとめて取る
+    4. リビジョンが変わった記事・新しい記事だけ本文を取り直して上書きし、
+       なくなった記事の行は消す
+    """
+
+    def __init__(self, scraper, harvester=None, discover=True):
+        self.scraper = scraper
+        self.writer = scraper.writer
+        self.harvester = harvester or MediaWikiHarvester(scraper, session=scraper.session)
+        self.discover = discover
+
+    def discover_titles(self):
+        """開始カテゴリから下をたどって、駅の記事タイトルを集める"""
+        queue = deque(url_to_title(self.scraper.base_url + c) for c in self.scraper.start_categories)
+        seen_cats, titles = set(queue), set()
+        while queue:
+            for member in self.harvester.category_members(queue.popleft()):
+                if member["ns"] == 14 and member["title"] not in seen_cats:
+                    seen_cats.add(member["title"])
+                    queue.append(member["title"])
+                elif member["ns"] == 0 and "駅" in member["title"]:
+                    titles.add(member["title"])
+        return titles
+
+    def run(self):
+        known = self.writer.known_revisions()
+        titles = set(known)
+        if self.discover:
+            titles |= self.discover_titles()
+
+        latest = self.harvester.latest_revisions(sorted(titles))
+        changed = sorted(t for t in titles if latest.get(t) is not None and latest[t] != known.get(t))
+        gone = sorted(t for t in known if latest.get(t) is None)
+
+        failed = 0
+        for i in range(0, len(changed), MAX_TITLES):
+            chunk = changed[i:i + MAX_TITLES]
+            try:
+                pages = self.harvester.fetch_pages(chunk)
+            except Exception as e:
+                # この50件だけあきらめて次へ（リビジョンは記録されないので、次の差分更新で取り直す）
+                failed += len(chunk)
+                print(f"      [!] 記事取得失敗 ({len(chunk)}件): {e}")
+                continue
+            for title in chunk:
+                try:
+                    rev_id, rows = self.harvester.page_rows(pages.get(title))
+                    self.scraper.save_page(title_to_url(self.scraper.base_url, title), rev_id, rows)
+                except Exception as e:
+                    failed += 1
+                    print(f"      [!] 記事取得失敗 {title}: {e}")
+        write_error = None
+        try:
+            with self.scraper.metrics.stage("flush"):
+                self.writer.flush()
+        except Exception as e:
+            write_error = str(e)
+            print(f"      [!] 保存失敗: {e}")
+        # 書き出しに失敗したときは消さない（失敗を取り直す前に行だけ減らさない）。消すのは次の差分更新で
+        removed, remove_error = 0, None
+        if write_error is None and gone:
+            try:
+                removed = self.writer.remove_pages(gone)
+            except Exception as e:
+                remove_error = str(e)
+                print(f"      [!] 削除失敗: {e}")
+        removed_pages = len(gone) if write_error is None and remove_error is None else 0
+
+        # 保存できたかは station_pages のリビジョンで確かめる（書き込みに失敗したバッチの記事は古いまま）
+        saved = self.writer.known_revisions()
+        written = {t for t in changed if t in saved and saved[t] != known.get(t)}
+        summary = {
+            "checked": len(titles),
+            "changed": len(written),
+            "new": sum(1 for t in written if t not in known),
+            "unchanged": sum(1 for t in titles if latest.get(t) is not None and latest[t] == known.get(t)),
+            "removed_pages": removed_pages,
+            "removed_rows": removed,
+            "remove_skipped": len(gone) - removed_pages,
+            "failed": failed,
+            "write_failed": len(changed) - failed - len(written),
+            "write_error": write_error,
+            "remove_error": remove_error,
+            "requests": self.harvester.requests_made,
+        }
+        print(f"差分更新: 確認 {summary['checked']}件 / 更新 {summary['changed']}件（うち新規 {summary['new']}件）"
+              f" / 変更なし {summary['unchanged']}件 / 削除 {summary['removed_pages']}記事 ({summary['removed_rows']}行)"
+              f" / APIリクエスト {summary['requests']}回")
+        if failed or summary["write_failed"]:
+            print(f"      [!] 取り直せなかった記事 {failed}件 / 保存できなかった記事 {summary['write_failed']}件"
+                  "（次の差分更新で取り直します）")
+        if summary["remove_skipped"]:
+            print(f"      [!] 消せなかった記事 {summary['remove_skipped']}件（次の差分更新で消します）")
+        return summary
@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import zipfile
+from urllib.parse import unquote
+
+import httpx
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+INDEX_NAME = "index.json"
+# 本文はデコード済みで保存するので、再生時にこれらのヘッダは付けない
+DROP_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def _key(url):
+    # requests と httpx でパーセントエンコードの表記が違っても同じURLとして扱う
+    return unquote(url)
+
+
+class ReplayArchive:
+    """取得したレスポンスを zip にまとめて保存・再生するアーカイブ
+
+    本文は responses/<URLのsha1>.html に、URL → (ファイル名, ステータス, ヘッダ) の対応は
+    index.json に入れる。mode="w" で記録、mode="r" で再生。
+    """
+
+    def __init__(self, path, mode="r", base_url=None):
+        self.path = path
+        self.mode = mode
+        self.lock = threading.Lock()
+        if mode == "w":
+            self.zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+            self.index = {"base_url": base_url, "created_at": time.time(), "responses": {}}
+        else:
+            self.zip = zipfile.ZipFile(path, "r")
+            self.index = json.loads(self.zip.read(INDEX_NAME).decode("utf-8"))
+
+    @property
+    def base_url(self):
+        return self.index.get("base_url")
+
+    def __len__(self):
+        return len(self.index["responses"])
+
+    def add(self, url, status, headers, body):
+        url = _key(url)
+        name = "responses/" + hashlib.sha1(url.encode("utf-8")).hexdigest() + ".html"
+        keep = {k: v for k, v in headers.items() if k.lower() in ("content-type", "etag", "last-modified")}
+        with self.lock:
+            if url in self.index["responses"]: return
+            self.zip.writestr(name, body)
+            self.index["responses"][url] = {"file": name, "status": status, "headers": keep}
+
+    def get(self, url):
+        """(ステータス, ヘッダ, 本文bytes) を返す。記録がなければ None"""
+        entry = self.index["responses"].get(_key(url))
+        if entry is None: return None
+        with self.lock:
+            body = self.zip.read(entry["file"])
+        return entry["status"], entry["headers"], body
+
+    def close(self):
+        if self.mode == "w":
+            self.zip.writestr(INDEX_NAME, json.dumps(self.index, ensure_ascii=False))
+        self.zip.close()
+
+
+def _not_recorded(url):
+    return 404, {"Content-Type": "text/plain"}, f"not recorded: {url}".encode("utf-8")
+
+
+# --- requests 用（同期モード・APIモード） ---
+
+class ReplayAdapter(BaseAdapter):
+    """アーカイブからレスポンスを返す requests のアダプタ（latency 秒の遅延を入れる）"""
+
+    def __init__(self, archive, latency=0.0):
+        super().__init__()
+        self.archive = archive
+        self.latency = latency
+
+    def send(self, request, **kwargs):
+        if self.latency: time.sleep(self.latency)
+        status, headers, body = self.archive.get(request.url) or _not_recorded(request.url)
+        res = requests.Response()
+        res.status_code = status
+        res.headers.update(headers)
+        res._content = body
+        res.encoding = "utf-8"
+        res.url = request.url
+        res.request = request
+        return res
+
+    def close(self):
+        pass
+
+
+class RecordingAdapter(HTTPAdapter):
+    """本物の通信をしつつ、200 のレスポンスをアーカイブに記録するアダプタ"""
+
+    def __init__(self, archive, **kwargs):
+        super().__init__(**kwargs)
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        res = super().send(request, **kwargs)
+        if res.status_code == 200:
+            self.archive.add(request.url, res.status_code, res.headers, res.content)
+        return res
+
+
+# --- httpx 用（非同期モード・パイプラインモード） ---
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, archive, latency=0.0):
+        self.archive = archive
+        self.latency = latency
+
+    async def handle_async_request(self, request):
+        if self.latency: await asyncio.sleep(self.latency)
+        url = str(request.url)
+        status, headers, body = self.archive.get(url) or _not_recorded(url)
+        return httpx.Response(status, headers=headers, content=body, request=request)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, archive, inner=None):
+        self.archive = archive
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        res = await self.inner.handle_async_request(request)
+        body = await res.aread()
+        if res.status_code == 200:
+            self.archive.add(str(request.url), res.status_code, res.headers, body)
+        headers = [(k, v) for k, v in res.headers.items() if k.lower() not in DROP_HEADERS]
+        return httpx.Response(res.status_code, headers=headers, content=body, request=request)
+
+    async def aclose(self):
+        await self.inner.aclose()
@@ -0,0 +1,48 @@
+import json
+import os
+
+import pyarrow as pa
+from pyarrow import ipc
+
+FINGERPRINT_KEY = b"fingerprint"
+
+
+class StationSnapshot:
+    """クレンジング済みの stations を Arrow IPC ファイルとして手元に置いておくキャッシュ
+
+    圧縮しない IPC 形式なのでメモリマップでそのまま読める。カテゴリ型の列は
+    Arrow の辞書型として保存され、読むとまたカテゴリ型に戻る。
+    スキーマのメタデータに DB のフィンガープリント（行数・最終更新時刻など）を入れておき、
+    一致するときだけ使う。
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def fingerprint(self):
+        """保存したときのフィンガープリント（ファイルがなければ None）"""
+        if not self.exists(): return None
+        with pa.memory_map(self.path) as source:
+            metadata = ipc.open_file(source).schema.metadata or {}
+        raw = metadata.get(FINGERPRINT_KEY)
+        return json.loads(raw) if raw else None
+
+    def load(self):
+        with pa.memory_map(self.path) as source:
+            table = ipc.open_file(source).read_all()
+        return table.to_pandas()
+
+    def save(self, df, fingerprint):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            FINGERPRINT_KEY: json.dumps(fingerprint, ensure_ascii=False).encode("utf-8"),
+        })
+        # 書いている途中のファイルを読まれないように、一時ファイルから置き換える
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, self.path)
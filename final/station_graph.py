@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse import csgraph
+
+# all_pairs() で到達できない駅の組に入る値
+UNREACHABLE = np.iinfo(np.uint8).max
+
+
+class StationGraph:
+    """駅と路線の二部グラフ（疎行列）で乗り換え回数を求める
+
+    incidence は 駅 × 路線 の CSR 行列（その駅にその路線が通っていれば 1）。
+    乗り換えは「路線から路線へ」の移動なので、路線どうしのグラフ
+    （同じ駅を通る路線を結ぶ）で BFS すれば、駅数より小さいグラフで済む。
+
+        駅 a から駅 b への最少乗り換え回数
+            = min(路線グラフ上の距離(a の路線, b の路線))
+    """
+
+    def __init__(self, df):
+        pairs = df[['station_name', 'line_name']].dropna().drop_duplicates()
+        st = pd.Categorical(pairs['station_name'].astype(str))
+        ln = pd.Categorical(pairs['line_name'].astype(str))
+        self.stations = pd.Index(st.categories, name='station_name')
+        self.lines = pd.Index(ln.categories, name='line_name')
+        # 路線 × 路線 の積は共通の駅数になるので、int8 だと 128 駅以上で桁あふれする
+        data = np.ones(len(pairs), dtype=np.int32)
+        self.incidence = sparse.csr_matrix((data, (st.codes, ln.codes)),
+                                           shape=(len(self.stations), len(self.lines)))
+        self.incidence.sort_indices()
+        # 路線 × 路線（共通の駅があれば乗り換えられる。駅数は要らないので 0/1 にする）
+        line_adj = ((self.incidence.T @ self.incidence) > 0).astype(np.int32).tocsr()
+        line_adj.setdiag(0)
+        line_adj.eliminate_zeros()
+        self.line_adj = line_adj
+        self._line_dist = None
+
+    def _station_id(self, name):
+        try:
+            return self.stations.get_loc(name)
+        except KeyError:
+            raise KeyError(f"{name} は路線データにありません") from None
+
+    def _lines_of(self, i):
+        return self.incidence.indices[self.incidence.indptr[i]:self.incidence.indptr[i + 1]]
+
+    def line_distances(self):
+        """全路線間の乗り換え回数（BFS、到達できなければ inf）。一度計算したら使い回す"""
+        if self._line_dist is None:
+            self._line_dist = csgraph.shortest_path(self.line_adj, unweighted=True, directed=False)
+        return self._line_dist
+
+    def _from_lines(self, lines):
+        """出発路線の集合から、各路線までの最少乗り換え回数"""
+        dist = csgraph.shortest_path(self.line_adj, unweighted=True, directed=False, indices=lines)
+        return dist.min(axis=0)
+
+    def _station_min(self, per_line):
+        """路線ごとの値 (…, 路線数) を、各駅の路線の中での最小値 (…, 駅数) にまとめる"""
+        return np.minimum.reduceat(per_line[..., self.incidence.indices], self.incidence.indptr[:-1], axis=-1)
+
+    def transfers(self, a, b):
+        """駅 a から駅 b への最少乗り換え回数（同じ路線なら 0、たどり着けなければ None）"""
+        i, j = self._station_id(a), self._station_id(b)
+        if i == j: return 0
+        best = self._from_lines(self._lines_of(i))[self._lines_of(j)].min()
+        return None if np.isinf(best) else int(best)
+
+    def reachable(self, station, k):
+        """k 回以内の乗り換えで行ける駅と、その乗り換え回数"""
+        dist = self._station_min(self._from_lines(self._lines_of(self._station_id(station))))
+        dist[self._station_id(station)] = 0
+        mask = dist <= k
+        return pd.Series(dist[mask].astype(int), index=self.stations[mask], name='transfers').sort_values(kind='stable')
+
+    def all_pairs(self, block=256):
+        """全駅間の乗り換え回数の行列 (駅数 × 駅数, uint8, 到達不能は UNREACHABLE)
+
+        路線間の距離から「駅 × 路線」の最小値を作り、それを駅の路線ごとにもう一度最小値で
+        まとめる。2回目の gather は 駅数 × 駅×路線数 になるので block 駅ずつ行う。
+        """
+        line_dist = self.line_distances()
+        line_dist = np.where(np.isinf(line_dist), UNREACHABLE, line_dist).astype(np.uint8)
+        indices, starts = self.incidence.indices, self.incidence.indptr[:-1]
+        per_line = np.minimum.reduceat(line_dist[indices], starts, axis=0)
+        n = len(self.stations)
+        dist = np.empty((n, n), dtype=np.uint8)
+        for i in range(0, n, block):
+            dist[i:i + block] = np.minimum.reduceat(per_line[i:i + block, indices], starts, axis=1)
+        np.fill_diagonal(dist, 0)
+        return dist
+
+    def centrality(self, dist=None):
+        """駅ごとの中心性: 路線数、乗り換えなしで行ける駅数、closeness（全駅へ平均何本乗るかの逆数）"""
+        if dist is None:
+            dist = self.all_pairs()
+        n = len(self.stations)
+        reachable = dist != UNREACHABLE
+        count = reachable.sum(axis=1) - 1
+        # 乗る路線の本数（乗り換え回数 + 1）の合計で測る
+        total = np.where(reachable, dist, 0).sum(axis=1, dtype=np.int64) + count
+        # 到達できる駅の割合を掛けて、小さな連結成分の駅が高く出ないようにする（Wasserman–Faust）
+        closeness = np.divide(count, total, out=np.zeros(n), where=total > 0) * (count / max(n - 1, 1))
+        direct = (dist == 0).sum(axis=1) - 1
+        return pd.DataFrame({
+            'lines': self.incidence.getnnz(axis=1),
+            'direct_reach': direct,
+            'closeness': closeness,
+        }, index=self.stations).sort_values(['closeness', 'lines'], ascending=False, kind='stable')
@@ -0,0 +1,201 @@
+import argparse
+import bisect
+import hashlib
+import io
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+from station_views import STATION_IDS_SQL, refresh_hub_view
+
+# 末尾の曖昧さ回避 「品川 (東京都)」「大塚（東京都）」
+_PAREN_RE = re.compile(r"\s*[(（][^()（）]*[)）]\s*$")
+# 事業者名 + 区切り 「JR 品川」「東京メトロ・銀座」。
+# 「京王八王子」「JR総持寺」のように区切りなしで続くものは正式な駅名なので消さない
+OPERATORS = ["JR", "東京メトロ", "都営", "都営地下鉄", "京王", "小田急", "東急", "京急", "京成", "西武", "東武",
+             "相鉄", "りんかい線", "ゆりかもめ", "多摩モノレール", "東京モノレール", "つくばエクスプレス"]
+_OPERATOR_RE = re.compile(r"^(?:%s)[\s・･/／]+" % "|".join(map(re.escape, sorted(OPERATORS, key=len, reverse=True))))
+# 「市ヶ谷」「市ケ谷」のような表記ゆれ
+_KANA_FOLD = str.maketrans({"ヶ": "ケ", "ヵ": "カ", "ゕ": "カ", "ゖ": "ケ"})
+# カタカナの長音をハイフン類で書いたもの 「東京テレポ-ト」
+_DASH_RE = re.compile(r"(?<=[ァ-ヺー])[-‐‑‒–—―−]")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def normalize_name(name):
+    """表記ゆれを吸収した比較用の駅名（全角半角・曖昧さ回避・事業者名・ヶ/ケ・長音）"""
+    name = unicodedata.normalize("NFKC", name).strip()
+    while True:
+        stripped = _PAREN_RE.sub("", name)
+        if stripped == name: break
+        name = stripped
+    name = _OPERATOR_RE.sub("", name)
+    name = re.sub(r"\s+", "", name).translate(_KANA_FOLD)
+    name = _DASH_RE.sub("ー", name)
+    if len(name) > 1 and name.endswith("駅"):
+        name = name[:-1]
+    return name
+
+
+def trigrams(name):
+    padded = f"^{name}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def station_id(location, canonical_name):
+    """(区, 正規名) から決まる ID（実行し直しても同じ駅には同じ ID が付く）"""
+    digest = hashlib.blake2b(f"{location}\t{canonical_name}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1  # BIGINT に収まるように
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i != j: self.parent[max(i, j)] = min(i, j)
+
+
+class StationNameResolver:
+    """駅名の表記ゆれをまとめて、(区, 駅名) ごとに正規の駅 ID を付ける
+
+    1. normalize_name で決まりきった表記ゆれを揃える（完全一致でまとまる）
+    2. 残りは同じ区の中で文字 trigram の Jaccard 係数が threshold 以上のものをまとめる。
+       候補は (区, trigram) → 駅名 の転置索引で引くので、全ペアを比べることはない。
+       max_postings より多くの駅名に出てくる trigram（「^新宿」など）は候補出しに使わない。
+       数字が違うもの（「1丁目」と「2丁目」）は似ていても別の駅とする。
+    """
+
+    def __init__(self, threshold=0.7, max_postings=200):
+        self.threshold = threshold
+        self.max_postings = max_postings
+
+    def candidate_pairs(self, locations, keys):
+        """同じ区で trigram を共有する (i, j, Jaccard係数) を返す（i < j）"""
+        grams = [trigrams(k) for k in keys]
+        index = defaultdict(list)
+        for i, (loc, gs) in enumerate(zip(locations, grams)):
+            for g in gs:
+                index[(loc, g)].append(i)
+        for i, (loc, gs) in enumerate(zip(locations, grams)):
+            shared = Counter()
+            for g in gs:
+                postings = index[(loc, g)]
+                if len(postings) > self.max_postings: continue
+                # postings は番号順に並んでいるので、i より後ろだけを切り出す
+                shared.update(postings[bisect.bisect_right(postings, i):])
+            for j, n in shared.items():
+                yield i, j, n / (len(gs) + len(grams[j]) - n)
+
+    def resolve(self, names):
+        """names: station_name, location, rows（行数）の DataFrame
+        → station_name, location, station_id, canonical_name の対応表"""
+        names = names.dropna(subset=["station_name", "location"])
+        names = names.assign(key=names["station_name"].map(normalize_name))
+        groups = names.groupby(["location", "key"], sort=True)["rows"].sum().reset_index()
+
+        uf = _UnionFind(len(groups))
+        keys = groups["key"].tolist()
+        for i, j, score in self.candidate_pairs(groups["location"].tolist(), keys):
+            if score >= self.threshold and _DIGITS_RE.findall(keys[i]) == _DIGITS_RE.findall(keys[j]):
+                uf.union(i, j)
+        groups["cluster"] = [uf.find(i) for i in range(len(groups))]
+
+        # ID に使う比較用の名前（key）は行数を見ずにまとまりの中で辞書順最小のものにする
+        # （行数で選ぶと、表記の多い少ないが入れ替わっただけで ID が変わってしまう）
+        groups["canonical_key"] = groups["cluster"].map(groups.groupby("cluster")["key"].min())
+
+        mapping = names.merge(groups[["location", "key", "cluster", "canonical_key"]], on=["location", "key"])
+        ranked = mapping.assign(length=mapping["station_name"].str.len()) \
+            .sort_values(["cluster", "rows", "length", "station_name"], ascending=[True, False, True, True])
+        # 表示する正規名は元データの表記から、行数が一番多いもの（同数なら短い方、さらに同じなら辞書順）
+        mapping["canonical_name"] = mapping["cluster"].map(
+            ranked.drop_duplicates("cluster").set_index("cluster")["station_name"])
+        # ID は canonical_key から作る（一番多い表記が入れ替わっても同じ駅の ID は変わらない）
+        mapping["station_id"] = [station_id(loc, k) for loc, k in zip(mapping["location"], mapping["canonical_key"])]
+        return mapping[["station_name", "location", "station_id", "canonical_name"]]
+
+
+# --- DB との読み書き ---
+
+def read_names(conn):
+    return pd.read_sql("SELECT station_name, location, COUNT(*) AS rows FROM stations"
+                       " GROUP BY station_name, location", conn)
+
+
+def write_station_ids(conn, mapping):
+    """station_ids を丸ごと入れ替える（1トランザクションなので、読む側には途中の状態が見えない）"""
+    from db_writer import _copy_escape
+
+    # to_csv は COPY の text 形式のエスケープをしないので、駅名の \ やタブで列がずれないよう自分で書く
+    buf = io.StringIO()
+    for row in mapping.itertuples(index=False):
+        buf.write("\t".join(_copy_escape(v) for v in row) + "\n")
+    buf.seek(0)
+    with conn.cursor() as cur:
+        cur.execute(STATION_IDS_SQL)
+        cur.execute("TRUNCATE station_ids")
+        cur.copy_expert("COPY station_ids (station_name, location, station_id, canonical_name) FROM STDIN", buf)
+        cur.execute("UPDATE station_ids SET resolved_at = now()")
+    conn.commit()
+    # まとめ方が変わったので、区ごとの集計ビューも作り直す
+    refresh_hub_view(conn)
+
+
+def make_variants(stations=10000, areas=1700, variant_ratio=0.3, seed=0):
+    """全国規模の駅名リストに表記ゆれを混ぜた合成データ"""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    fullwidth = str.maketrans("0123456789", "０１２３４５６７８９")
+    rows = []
+    for i in range(stations):
+        base = f"合成{i}ケ丘"
+        loc = f"合成{i % areas}市"
+        rows.append((base, loc, int(rng.integers(1, 6))))
+        if rng.random() < variant_ratio:
+            variant = rng.choice([f"{base}(東京都)", base.replace("ケ", "ヶ"), f"JR {base}",
+                                  base.translate(fullwidth), f"{base}駅"])
+            rows.append((str(variant), loc, 1))
+    return pd.DataFrame(rows, columns=["station_name", "location", "rows"])
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="駅名の表記ゆれをまとめて station_ids に正規の駅IDを書き込む")
+    ap.add_argument("--threshold", type=float, default=0.7, help="trigram の Jaccard 係数がこれ以上なら同じ駅とみなす")
+    ap.add_argument("--synthetic", type=int, help="DB を使わずに、この駅数の合成データで時間を測る")
+    ap.add_argument("--dry-run", action="store_true", help="結果を表示するだけで書き込まない")
+    args = ap.parse_args()
+
+    conn = None
+    if args.synthetic:
+        names = make_variants(args.synthetic)
+    else:
+        import psycopg2
+        params = {"host": "localhost", "database": "dsprog2db", "user": "igarashiayaka", "password": ""}
+        conn = psycopg2.connect(**params)
+        names = read_names(conn)
+
+    start = time.perf_counter()
+    mapping = StationNameResolver(threshold=args.threshold).resolve(names)
+    elapsed = time.perf_counter() - start
+
+    merged = mapping[mapping["station_name"] != mapping["canonical_name"]]
+    print(f"駅名 {len(mapping)}件 → 駅 {mapping['station_id'].nunique()}件"
+          f"（表記ゆれ {len(merged)}件をまとめた, {elapsed:.2f}秒）")
+    for row in merged.head(10).itertuples():
+        print(f"  {row.location}: {row.station_name} → {row.canonical_name}")
+    if conn is not None:
+        if not args.dry_run:
+            write_station_ids(conn, mapping)
+            print("station_ids を更新しました")
+        conn.close()
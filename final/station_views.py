@@ -0,0 +1,78 @@
+"""区ごとの駅・路線数の集計を Postgres 側で持つためのマテリアライズドビュー
+
+クローラー（main.py）からも使うので、pandas などには依存しない。
+"""
+
+# 駅名にこれを含む行は分析から外す
+EXCLUDE = ["信号場", "貨物", "廃止", "国鉄", "下河原", "須賀"]
+EXCLUDE_PATTERNS = [f"%{word}%" for word in EXCLUDE]
+
+VIEW_NAME = "ward_station_lines"
+# ビューの定義を変えたら上げる（古い定義のビューは作り直す）
+VIEW_VERSION = "2"
+
+# 表記ゆれをまとめた駅名の対応表（station_names.py が書き込む）
+STATION_IDS_SQL = """
+    CREATE TABLE IF NOT EXISTS station_ids (
+        station_name TEXT NOT NULL,
+        location TEXT NOT NULL,
+        station_id BIGINT NOT NULL,
+        canonical_name TEXT NOT NULL,
+        resolved_at TIMESTAMPTZ,
+        PRIMARY KEY (station_name, location)
+    );
+"""
+
+# stations に正規の駅名をつなげた FROM 句（対応表にない駅は元の駅名のまま）
+CANONICAL_SOURCE = "stations s LEFT JOIN station_ids i ON i.station_name = s.station_name AND i.location = s.location"
+CANONICAL_NAME = "COALESCE(i.canonical_name, s.station_name)"
+
+# (区, 駅名) → 路線数。ビューの中身と、ビューを使わないときの副問い合わせで共通
+# 表記ゆれをまとめると同じ路線が2行になることがあるので DISTINCT で数える
+def aggregate_sql(canonical=True):
+    """canonical=False は station_ids がまだない DB 用（元の駅名のまま数える）"""
+    name, source = (CANONICAL_NAME, CANONICAL_SOURCE) if canonical else ("s.station_name", "stations s")
+    return f"""
+        SELECT s.location, {name} AS station_name, COUNT(DISTINCT s.line_name) AS line_count
+        FROM {source}
+        WHERE s.location IS NOT NULL AND s.station_name IS NOT NULL
+          AND NOT (s.station_name LIKE ANY(%(patterns)s))
+        GROUP BY 1, 2
+    """
+
+
+# ビューは station_ids を作ってから定義するので、常に正規の駅名で数える
+AGGREGATE_SQL = aggregate_sql()
+
+CREATE_VIEW_SQL = f"""
+    CREATE MATERIALIZED VIEW {VIEW_NAME} AS {AGGREGATE_SQL};
+    -- REFRESH ... CONCURRENTLY には一意インデックスが要る
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_{VIEW_NAME}_key ON {VIEW_NAME} (location, station_name);
+    CREATE INDEX IF NOT EXISTS idx_{VIEW_NAME}_hubs ON {VIEW_NAME} (location, line_count DESC) WHERE line_count >= 2;
+"""
+
+
+def has_station_ids(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('station_ids') IS NOT NULL")
+        return cur.fetchone()[0]
+
+
+def ensure_hub_view(conn):
+    """ビューがなければ作る（作った時点の stations で中身が入る）。定義が古ければ作り直す"""
+    with conn.cursor() as cur:
+        cur.execute(STATION_IDS_SQL)
+        cur.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", (VIEW_NAME,))
+        if cur.fetchone()[0] != VIEW_VERSION:
+            cur.execute(f"DROP MATERIALIZED VIEW IF EXISTS {VIEW_NAME}")
+            cur.execute(CREATE_VIEW_SQL, {"patterns": EXCLUDE_PATTERNS})
+            cur.execute(f"COMMENT ON MATERIALIZED VIEW {VIEW_NAME} IS %s", (VIEW_VERSION,))
+    conn.commit()
+
+
+def refresh_hub_view(conn):
+    """クロールのあとに呼ぶ。CONCURRENTLY なので更新中も古い中身を読める"""
+    ensure_hub_view(conn)
+    with conn.cursor() as cur:
+        cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {VIEW_NAME}")
+    conn.commit()
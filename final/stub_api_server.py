@@ -0,0 +1,190 @@
+import argparse
+import html
+import json
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "mediawiki.json")
+
+# continue / 「次の200件」を試せるように、1ページあたりの件数を小さくしている
+PAGE_SIZE = 3
+
+
+def _wiki_href(title):
+    return "/wiki/" + quote(title.replace(" ", "_"), safe="/:(),!*;@$~")
+
+
+class StubWiki:
+    """フィクスチャから MediaWiki API と記事HTMLを返すオフライン用のWiki"""
+
+    def __init__(self, fixture_path=DEFAULT_FIXTURE, latency=0.0):
+        with open(fixture_path, encoding="utf-8") as f:
+            self.data = json.load(f)
+        self.latency = latency
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def count(self, kind):
+        with self.lock:
+            self.counts[kind] += 1
+
+    def members(self, title):
+        cat = self.data["categories"].get(title, {"subcats": [], "pages": []})
+        out = [{"ns": 14, "title": t} for t in cat["subcats"]]
+        for t in cat["pages"]:
+            page = self.data["pages"].get(t)
+            out.append({"ns": 0, "title": t, "pageid": page["pageid"] if page else 0})
+        return out
+
+    # --- API ---
+    def api(self, params):
+        if params.get("action") != "query":
+            return {"error": {"code": "badvalue", "info": "only action=query is supported"}}
+        if params.get("list") == "categorymembers":
+            self.count("api_categorymembers")
+            members = self.members(params.get("cmtitle", ""))
+            limit = params.get("cmlimit", "max")
+            size = PAGE_SIZE if limit == "max" else min(int(limit), PAGE_SIZE)
+            start = int(params.get("cmcontinue", "0"))
+            data = {"batchcomplete": True, "query": {"categorymembers": members[start:start + size]}}
+            if start + size < len(members):
+                data["continue"] = {"cmcontinue": str(start + size), "continue": "-||"}
+            return data
+        if params.get("prop") == "revisions":
+            self.count("api_revisions")
+            return self.revisions(params)
+        if params.get("prop") == "info":
+            self.count("api_info")
+            return self.info(params)
+        return {"error": {"code": "badvalue", "info": "unsupported query"}}
+
+    def revisions(self, params):
+        titles = params.get("titles", "").split("|")
+        if len(titles) > 50:
+            return {"error": {"code": "toomanyvalues", "info": "Too many values supplied for parameter titles"}}
+        normalized, pages = [], []
+        want_content = "content" in params.get("rvprop", "")
+        for t in titles:
+            norm = t.replace("_", " ")
+            if norm != t:
+                normalized.append({"from": t, "to": norm})
+            page = self.data["pages"].get(norm)
+            if page is None:
+                pages.append({"ns": 0, "title": norm, "missing": True})
+                continue
+            rev = {"revid": page["revid"], "timestamp": page["timestamp"]}
+            if want_content:
+                rev["slots"] = {"main": {"contentmodel": "wikitext", "content": page["wikitext"]}}
+            pages.append({"pageid": page["pageid"], "ns": 0, "title": norm, "revisions": [rev]})
+        query = {"pages": pages}
+        if normalized: query["normalized"] = normalized
+        return {"batchcomplete": True, "query": query}
+
+    def info(self, params):
+        titles = params.get("titles", "").split("|")
+        if len(titles) > 50:
+            return {"error": {"code": "toomanyvalues", "info": "Too many values supplied for parameter titles"}}
+        pages = []
+        for t in titles:
+            page = self.data["pages"].get(t.replace("_", " "))
+            if page is None:
+                pages.append({"ns": 0, "title": t, "missing": True})
+            else:
+                pages.append({"pageid": page["pageid"], "ns": 0, "title": t, "lastrevid": page["revid"],
+                              "touched": page["timestamp"]})
+        return {"batchcomplete": True, "query": {"pages": pages}}
+
+    # --- HTML ---
+    def category_html(self, title, start):
+        self.count("html_category")
+        members = self.members(title)
+        subcats = [m for m in members if m["ns"] == 14]
+        pages = [m for m in members if m["ns"] == 0]
+        chunk = pages[start:start + PAGE_SIZE]
+        sub_html = "".join(f'<li><a href="{_wiki_href(m["title"])}" title="{html.escape(m["title"])}">'
+                           f'{html.escape(m["title"].split(":", 1)[1])}</a></li>' for m in subcats)
+        page_html = "".join(f'<li><a href="{_wiki_href(m["title"])}" title="{html.escape(m["title"])}">'
+                            f'{html.escape(m["title"])}</a></li>' for m in chunk)
+        nav = ""
+        if start + PAGE_SIZE < len(pages):
+            nav = (f'(<a href="/w/index.php?title={quote(title)}&amp;pagefrom={start + PAGE_SIZE}"'
+                   f' title="{html.escape(title)}">次の200件</a>)')
+        return (f'<!DOCTYPE html><html lang="ja"><body><h1 id="firstHeading">{html.escape(title)}</h1>'
+                f'<div id="mw-subcategories"><div class="mw-category-group"><h3>*</h3><ul>{sub_html}</ul></div></div>'
+                f'<div id="mw-pages">{nav}<div class="mw-category-group"><h3>*</h3><ul>{page_html}</ul></div>{nav}</div>'
+                f'</body></html>')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    wiki = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_body(self, status, body, content_type, headers=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        wiki = self.wiki
+        if wiki.latency: time.sleep(wiki.latency)
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if url.path == "/w/api.php":
+            return self.send_body(200, json.dumps(wiki.api(params), ensure_ascii=False), "application/json; charset=utf-8")
+        if url.path == "/w/index.php" and "title" in params:
+            return self.send_body(200, wiki.category_html(params["title"], int(params.get("pagefrom", "0"))),
+                                  "text/html; charset=utf-8")
+        if url.path == "/_stats":
+            return self.send_body(200, json.dumps(dict(wiki.counts)), "application/json")
+        if url.path.startswith("/wiki/"):
+            title = unquote(url.path[len("/wiki/"):]).replace("_", " ")
+            if title.startswith("Category:"):
+                return self.send_body(200, wiki.category_html(title, 0), "text/html; charset=utf-8")
+            page = wiki.data["pages"].get(title)
+            if page is None:
+                return self.send_body(404, "not found", "text/plain")
+            etag = f'"{page["revid"]}"'
+            if self.headers.get("If-None-Match") == etag:
+                wiki.count("html_304")
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            wiki.count("html_page")
+            return self.send_body(200, page["html"], "text/html; charset=utf-8", {"ETag": etag})
+        self.send_body(404, "not found", "text/plain")
+
+
+def start_stub_server(fixture_path=DEFAULT_FIXTURE, port=0, latency=0.0):
+    """別スレッドでスタブサーバーを立ち上げて (server, base_url) を返す"""
+    handler = type("BoundStubHandler", (StubHandler,), {"wiki": StubWiki(fixture_path, latency)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="フィクスチャを返す MediaWiki のスタブサーバー")
+    ap.add_argument("--fixture", default=DEFAULT_FIXTURE)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="1リクエストごとに入れる遅延（秒）")
+    args = ap.parse_args()
+    server, base_url = start_stub_server(args.fixture, args.port, args.latency)
+    print(f"スタブサーバー起動: {base_url}  (Ctrl+C で終了)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
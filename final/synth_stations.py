@@ -0,0 +1,166 @@
+import argparse
+import io
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from station_views import EXCLUDE
+
+STATION_COLUMNS = ["station_name", "line_name", "company_name", "location"]
+
+# 本物の stations と同じ列（(駅名, 路線名) は重ならない）
+POSTGRES_SETUP_SQL = """
+    DROP SCHEMA IF EXISTS {schema} CASCADE;
+    CREATE SCHEMA {schema};
+    CREATE TABLE {schema}.stations (
+        station_name TEXT, line_name TEXT, company_name TEXT, location TEXT,
+        UNIQUE (station_name, line_name)
+    );
+"""
+
+SQLITE_SETUP_SQL = """
+    DROP TABLE IF EXISTS stations;
+    CREATE TABLE stations (
+        station_name TEXT, line_name TEXT, company_name TEXT, location TEXT,
+        UNIQUE (station_name, line_name)
+    );
+"""
+
+COMPANIES = ["合成電鉄", "合成メトロ", "合成交通局", "合成急行", "合成モノレール"]
+
+_FULLWIDTH = str.maketrans("0123456789", "０１２３４５６７８９")
+# 表記ゆれの作り方（station_names.normalize_name でまとまるもの）
+VARIANTS = [
+    lambda name: f"{name}(東京都)",
+    lambda name: f"JR {name}",
+    lambda name: name.translate(_FULLWIDTH),
+    lambda name: name.replace("ヶ", "ケ") if "ヶ" in name else f"{name}駅",
+]
+
+
+def make_stations(rows, wards=23, mean_lines=1.6, max_lines=12, stops_per_line=25, variant_ratio=0.05,
+                  excluded_ratio=0.02, ward_skew=0.8, seed=0):
+    """本物の stations に似せた合成データ（列はカテゴリ型なので 1000万行でもメモリに載る）
+
+    - 駅ごとの路線数は 1 + 幾何分布（ほとんどが1路線、ときどき大きなハブ駅）
+    - 区の大きさは Zipf 風に偏らせる（ward_skew）
+    - 路線は区の順に並べた駅を stops_per_line 駅ずつ通るので、同じ区の駅どうしで乗り換えられる
+    - variant_ratio の駅は、路線の1つだけ表記ゆれした駅名で入っている
+    - excluded_ratio の駅は除外語（信号場・貨物など）を含む
+    """
+    rng = np.random.default_rng(seed)
+    p = 1 / mean_lines
+    # 多めに作って、合計がちょうど rows 行になる駅数で切る（最後の駅は路線数を減らす）
+    lines_per_station = np.minimum(rng.geometric(p, int(rows * p * 1.2) + 10), max_lines)
+    stations = int(np.searchsorted(np.cumsum(lines_per_station), rows)) + 1
+    lines_per_station = lines_per_station[:stations]
+    lines_per_station[-1] -= lines_per_station.sum() - rows
+    ward_weights = 1 / np.arange(1, wards + 1) ** ward_skew
+    ward_of = np.sort(rng.choice(wards, stations, p=ward_weights / ward_weights.sum()))
+
+    names = np.array([f"合成{i}ヶ丘" if i % 7 == 0 else f"合成{i}" for i in range(stations)], dtype=object)
+    bad = rng.random(stations) < excluded_ratio
+    names[bad] = [f"{names[i]}{EXCLUDE[i % len(EXCLUDE)]}" for i in np.flatnonzero(bad)]
+
+    # 行ごとの駅と、その駅での何本目の路線か
+    first_row = np.cumsum(lines_per_station) - lines_per_station
+    station_idx = np.repeat(np.arange(stations), lines_per_station)
+    nth = np.arange(rows) - np.repeat(first_row, lines_per_station)
+    # 路線数が少なすぎると、1駅の何本目かの路線が同じ路線に重なってしまう
+    lines = max(stations // stops_per_line, max_lines * max_lines)
+    # 近くの駅（番号が近い）は同じ路線を通り、2本目以降は別の区間の路線になる
+    line_idx = (station_idx // stops_per_line + nth * (lines // max_lines + 1)) % lines
+
+    # 表記ゆれ: 選んだ駅の最初の行の駅名だけ変える（カテゴリの後ろに足す）
+    variant_stations = np.flatnonzero((rng.random(stations) < variant_ratio) & (lines_per_station >= 2))
+    variant_names = [VARIANTS[i % len(VARIANTS)](names[s]) for i, s in enumerate(variant_stations)]
+    codes = station_idx.copy()
+    codes[first_row[variant_stations]] = stations + np.arange(len(variant_stations))
+
+    station_cat = pd.Categorical.from_codes(codes, pd.Index(list(names) + variant_names))
+    line_cat = pd.Categorical.from_codes(line_idx, pd.Index([f"合成{i}線" for i in range(lines)]))
+    ward_cat = pd.Categorical.from_codes(ward_of[station_idx], pd.Index([f"合成{i}区" for i in range(wards)]))
+    company_cat = pd.Categorical.from_codes(line_idx % len(COMPANIES), pd.Index(COMPANIES))
+    return pd.DataFrame({"station_name": station_cat, "line_name": line_cat,
+                         "company_name": company_cat, "location": ward_cat})
+
+
+def _chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def load_postgres(df, db_params, schema, chunk_rows=500_000):
+    """scratch 用のスキーマに stations を作って COPY で流し込む（本物の stations は触らない）"""
+    import psycopg2
+    conn = psycopg2.connect(**db_params)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(POSTGRES_SETUP_SQL.format(schema=schema))
+            for chunk in _chunks(df[STATION_COLUMNS], chunk_rows):
+                buf = io.StringIO()
+                chunk.to_csv(buf, sep="\t", header=False, index=False)
+                buf.seek(0)
+                cur.copy_expert(f"COPY {schema}.stations FROM STDIN", buf)
+            cur.execute(f"CREATE INDEX ON {schema}.stations (location)")
+            cur.execute(f"ANALYZE {schema}.stations")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def load_sqlite(df, path, chunk_rows=500_000):
+    """Postgres がない環境向けの代わり（同じ列・同じ一意制約のテーブルを作る）"""
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(SQLITE_SETUP_SQL)
+        for chunk in _chunks(df[STATION_COLUMNS], chunk_rows):
+            conn.executemany("INSERT INTO stations VALUES (?, ?, ?, ?)",
+                             chunk.astype(object).itertuples(index=False, name=None))
+        conn.execute("CREATE INDEX idx_stations_location ON stations (location)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def read_sqlite(path):
+    conn = sqlite3.connect(path)
+    try:
+        return pd.read_sql("SELECT station_name, line_name, location FROM stations", conn)
+    finally:
+        conn.close()
+
+
+def describe(df):
+    lines = df.groupby("station_name", observed=True)["line_name"].count()
+    return {"rows": len(df), "stations": int(df["station_name"].nunique()), "lines": int(df["line_name"].nunique()),
+            "wards": int(df["location"].nunique()), "hubs": int((lines >= 2).sum()), "max_lines": int(lines.max())}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="本物に似せた合成の stations テーブルを作る")
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--wards", type=int, default=23)
+    ap.add_argument("--mean-lines", type=float, default=1.6, help="駅あたりの平均路線数")
+    ap.add_argument("--variant-ratio", type=float, default=0.05, help="表記ゆれを混ぜる駅の割合")
+    ap.add_argument("--excluded-ratio", type=float, default=0.02, help="除外語を含む駅の割合")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--sqlite", help="この SQLite ファイルに書き込む")
+    ap.add_argument("--postgres-schema", help="ローカルの Postgres のこのスキーマに書き込む（作り直す）")
+    args = ap.parse_args()
+
+    start = time.perf_counter()
+    df = make_stations(args.rows, wards=args.wards, mean_lines=args.mean_lines, variant_ratio=args.variant_ratio,
+                       excluded_ratio=args.excluded_ratio, seed=args.seed)
+    print(f"作成: {time.perf_counter() - start:.1f}秒  {describe(df)}")
+    if args.sqlite:
+        start = time.perf_counter()
+        load_sqlite(df, args.sqlite)
+        print(f"SQLite に書き込み: {time.perf_counter() - start:.1f}秒 → {args.sqlite}")
+    if args.postgres_schema:
+        from bench_sql import DB_PARAMS
+        start = time.perf_counter()
+        load_postgres(df, DB_PARAMS, args.postgres_schema)
+        print(f"Postgres に書き込み: {time.perf_counter() - start:.1f}秒 → {args.postgres_schema}.stations")
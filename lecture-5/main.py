@@ -116,31 +116,13 @@ def main(page: ft.Page):
         except: pass
         return None
 
-    def get_forecast_data(target_code, target_name):
-        url = f"https://www.jma.go.jp/bosai/forecast/data/forecast/{target_code}.json"
-        data = fetch_json(url)
-        found_mode = False
-
-        if data is None:
-            if target_code in REDIRECT_MAP:
-                data = fetch_json(f"https://www.jma.go.jp/bosai/forecast/data/forecast/{REDIRECT_MAP[target_code]}.json")
-                if data: found_mode = True
-
-            if data is None:
-                search_key = target_name.replace("地方", "").replace("県", "").replace("府", "").replace("都", "")
-                for code in SEARCH_TARGETS:
-                    if code == target_code: continue
-                    temp_data = fetch_json(f"https://www.jma.go.jp/bosai/forecast/data/forecast/{code}.json")
-                    if temp_data:
-                        try:
-                            if search_key in str(temp_data):
-                                data = temp_data
-                                found_mode = True
-                                break
-                        except: pass
-
-        if data is None: return "取得失敗", []
+    # エンドポイントごとに取得・解析した予報（同じ JSON を何度も取りに行かない）
+    FORECAST_TTL = 600  # 秒。予報は1日3回しか更新されないので10分は使い回す
+    forecast_cache = {}
+    fetch_stats = {"requests": 0, "saved": 0}
 
+    def parse_forecast(data):
+        """予報の JSON を1回だけ解析して、表示用の日付と (細分区域名, 天気リスト) を作る"""
         try:
             report = data[0]
             ts_weather = None
@@ -148,40 +130,73 @@ def main(page: ft.Page):
                 if "areas" in ts and ts["areas"] and "weathers" in ts["areas"][0]:
                     ts_weather = ts
                     break
-            
-            if not ts_weather: return "データなし", []
-
-            dates = ts_weather["timeDefines"]
-            weather_areas = ts_weather["areas"]
-            display_list = []
-            search_key = target_name.replace("地方", "").replace("県", "").replace("府", "").replace("都", "")
-
-            for w_area in weather_areas:
-                area_n = w_area["area"]["name"]
-                if found_mode:
-                    if search_key not in area_n: continue
-
-                weathers = w_area["weathers"]
-                for i in range(len(weathers)):
-                    if i >= len(dates): break
-                    try:
-                        dt = datetime.datetime.fromisoformat(dates[i].replace("Z", "+00:00"))
-                        date_str = dt.strftime("%m/%d")
-                        w_day = ["月","火","水","木","金","土","日"][dt.weekday()]
-                        date_disp = f"{date_str} ({w_day})"
-                    except: date_disp = "日付不明"
-
-                    display_list.append({
-                        "sub_area": area_n,
-                        "date": date_disp,
-                        "weather": weathers[i].replace("　", " ")
-                    })
-
-            if not display_list: return "データなし", []
-            return target_name, display_list
-
+            if not ts_weather: return {"dates": [], "areas": [], "text": str(data)}
+
+            dates = []
+            for d in ts_weather["timeDefines"]:
+                try:
+                    dt = datetime.datetime.fromisoformat(d.replace("Z", "+00:00"))
+                    date_str = dt.strftime("%m/%d")
+                    w_day = ["月","火","水","木","金","土","日"][dt.weekday()]
+                    dates.append(f"{date_str} ({w_day})")
+                except: dates.append("日付不明")
+            areas = [(w_area["area"]["name"], w_area["weathers"]) for w_area in ts_weather["areas"]]
+            return {"dates": dates, "areas": areas, "text": str(data)}
         except:
-            return "エラー", []
+            return None
+
+    def get_forecast_document(endpoint):
+        """エンドポイントの予報（解析済み）。取得できなければ None（失敗は覚えずに、次はまた取りに行く）"""
+        now = datetime.datetime.now().timestamp()
+        cached = forecast_cache.get(endpoint)
+        if cached and now - cached[0] < FORECAST_TTL:
+            fetch_stats["saved"] += 1
+            print(f"📡 {endpoint}.json は取得済み（リクエスト {fetch_stats['requests']}件, 節約 {fetch_stats['saved']}件）")
+            return cached[1]
+        fetch_stats["requests"] += 1
+        data = fetch_json(f"https://www.jma.go.jp/bosai/forecast/data/forecast/{endpoint}.json")
+        document = None if data is None else parse_forecast(data)
+        if document is not None:
+            forecast_cache[endpoint] = (now, document)
+        return document
+
+    def get_forecast_data(target_code, target_name):
+        found_mode = False
+        search_key = target_name.replace("地方", "").replace("県", "").replace("府", "").replace("都", "")
+
+        # リダイレクト先が分かっている地域は、最初からそちらのエンドポイントを取る
+        if target_code in REDIRECT_MAP:
+            document = get_forecast_document(REDIRECT_MAP[target_code])
+            if document: found_mode = True
+        else:
+            document = get_forecast_document(target_code)
+
+        if document is None:
+            for code in SEARCH_TARGETS:
+                if code == target_code: continue
+                temp_doc = get_forecast_document(code)
+                if temp_doc and search_key in temp_doc["text"]:
+                    document = temp_doc
+                    found_mode = True
+                    break
+
+        if document is None: return "取得失敗", []
+        if not document["areas"]: return "データなし", []
+
+        # 1つの JSON に入っている細分区域のうち、この地域のものだけを配る
+        display_list = []
+        for area_n, weathers in document["areas"]:
+            if found_mode:
+                if search_key not in area_n: continue
+            for date_disp, weather in zip(document["dates"], weathers):
+                display_list.append({
+                    "sub_area": area_n,
+                    "date": date_disp,
+                    "weather": weather.replace("　", " ")
+                })
+
+        if not display_list: return "データなし", []
+        return target_name, display_list
 
     # ==========================================
     # 2. UI & Map Update
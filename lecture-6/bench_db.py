@@ -0,0 +1,150 @@
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from db_init import LATEST_VIEW_SQL, MAP_POSITIONS, connect_db, create_tables, register_areas
+
+# 以前の weather.db の形（v1: AUTOINCREMENT の id + upsert 用の一意索引。v0 は索引もなし）
+LEGACY_SQL = """
+CREATE TABLE areas (code TEXT PRIMARY KEY, name TEXT NOT NULL, map_top INTEGER, map_left INTEGER);
+CREATE TABLE forecasts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    area_code TEXT,
+    forecast_date TEXT,
+    weather TEXT,
+    report_datetime TEXT,
+    FOREIGN KEY (area_code) REFERENCES areas(code)
+);
+"""
+LEGACY_INDEX_SQL = "CREATE UNIQUE INDEX idx_forecasts_report ON forecasts (area_code, forecast_date, report_datetime)"
+
+WEATHERS = ["晴れ", "くもり", "雨", "晴れ 時々 くもり", "くもり 一時 雨", "雪", "くもり 後 晴れ"]
+REPORT_HOURS = [5, 11, 17]
+
+
+def archive_rows(years, seed=0):
+    """1日3回の発表 × 3日分の予報 × 全地域を years 年分"""
+    rng = random.Random(seed)
+    start = datetime.date.today() - datetime.timedelta(days=365 * years)
+    for day in range(365 * years):
+        base = start + datetime.timedelta(days=day)
+        for hour in REPORT_HOURS:
+            report = f"{base.isoformat()}T{hour:02d}:00:00+09:00"
+            for code in MAP_POSITIONS:
+                for ahead in range(3):
+                    yield code, (base + datetime.timedelta(days=ahead)).isoformat(), rng.choice(WEATHERS), report
+
+
+def build(path, layout, years):
+    if layout == "v2":
+        conn = connect_db(path)
+        create_tables(conn)
+        register_areas(conn)
+    else:
+        conn = sqlite3.connect(path)
+        conn.executescript(LEGACY_SQL)
+        if layout == "v1": conn.execute(LEGACY_INDEX_SQL)
+        conn.executescript(LATEST_VIEW_SQL)
+        conn.executemany("INSERT INTO areas VALUES (?, ?, ?, ?)",
+                         [(c, i["name"], i["top"], i["left"]) for c, i in MAP_POSITIONS.items()])
+    start = time.perf_counter()
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO forecasts (area_code, forecast_date, weather, report_datetime)"
+                         " VALUES (?, ?, ?, ?)", archive_rows(years))
+    load = time.perf_counter() - start
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return load
+
+
+# 画面（main.py）が投げる問い合わせ
+def queries(dates):
+    codes = list(MAP_POSITIONS)
+    return {
+        "日付一覧": lambda i: ("SELECT DISTINCT forecast_date FROM forecasts ORDER BY forecast_date", ()),
+        "地域の全日付": lambda i: ("SELECT forecast_date, weather FROM latest_forecasts WHERE area_code = ?"
+                             " ORDER BY forecast_date", (codes[i % len(codes)],)),
+        "地域+日付": lambda i: ("SELECT forecast_date, weather FROM latest_forecasts"
+                            " WHERE area_code = ? AND forecast_date = ?",
+                            (codes[i % len(codes)], dates[(i * 7919) % len(dates)])),
+    }
+
+
+def measure(conn, make_query, n):
+    times = []
+    for i in range(n):
+        sql, params = make_query(i)
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99) - 1]
+
+
+def reads_during_writes(path, layout, seconds=2.0):
+    """書き込み（1000行ずつの upsert）を続けている間に、画面の問い合わせが何ms待たされるか"""
+    stop = threading.Event()
+
+    def writer():
+        conn = connect_db(path) if layout == "v2" else sqlite3.connect(path, timeout=10)
+        i = 0
+        while not stop.is_set():
+            report = f"9999-01-01T{i:06d}"
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO forecasts (area_code, forecast_date, weather, report_datetime)"
+                                 " VALUES (?, ?, ?, ?)",
+                                 [(code, f"2099-01-{d:02d}", "晴れ", report) for code in MAP_POSITIONS for d in range(1, 18)])
+            i += 1
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    conn = connect_db(path) if layout == "v2" else sqlite3.connect(path, timeout=10)
+    times, deadline = [], time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        conn.execute("SELECT forecast_date, weather FROM latest_forecasts WHERE area_code = '130000'"
+                     " AND forecast_date = '2099-01-05'").fetchall()
+        times.append((time.perf_counter() - start) * 1000)
+    stop.set()
+    thread.join()
+    conn.close()
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99) - 1]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="weather.db の形による画面の問い合わせ時間の比較（合成の数年分アーカイブ）")
+    ap.add_argument("--years", type=int, default=3)
+    ap.add_argument("--queries", type=int, default=300, help="問い合わせごとの回数")
+    ap.add_argument("--layouts", default="v0,v1,v2", help="v0: 索引なし / v1: 一意索引のみ / v2: 今の形")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_weather_")
+    print(f"{'形':<4} {'問い合わせ':<10} {'p50(ms)':>9} {'p99(ms)':>9}")
+    for layout in args.layouts.split(","):
+        path = os.path.join(tmp, f"{layout}.db")
+        load = build(path, layout, args.years)
+        conn = connect_db(path) if layout == "v2" else sqlite3.connect(path)
+        rows = conn.execute("SELECT COUNT(*) FROM forecasts").fetchone()[0]
+        dates = [r[0] for r in conn.execute("SELECT DISTINCT forecast_date FROM forecasts")]
+        size = os.path.getsize(path) / 1024 / 1024
+        print(f"{layout:<4} 読み込み {rows:,}行 {load:.1f}秒 / {size:.0f}MB")
+        for name, make_query in queries(dates).items():
+            n = args.queries if name != "日付一覧" else max(args.queries // 10, 5)
+            p50, p99 = measure(conn, make_query, n)
+            print(f"{layout:<4} {name:<10} {p50:>9.3f} {p99:>9.3f}")
+        conn.close()
+        p50, p99 = reads_during_writes(path, layout)
+        print(f"{layout:<4} {'書き込み中':<10} {p50:>9.3f} {p99:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
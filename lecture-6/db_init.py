@@ -1,37 +1,136 @@
+import argparse
+import datetime
 import sqlite3
 import requests
-import datetime
 import os
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from jma_forecast import DETAIL_TABLES_SQL, forecast_rows, short_series, write_rows
 
 # ---------------------------------------------------------
 # 1. データベース設定 & テーブル作成
 # ---------------------------------------------------------
 script_dir = os.path.dirname(os.path.abspath(__file__))
 dbname = os.path.join(script_dir, "weather.db")
-conn = sqlite3.connect(dbname)
-cur = conn.cursor()
-
-# areas テーブル（地域マスタ）
-cur.execute("""
-CREATE TABLE IF NOT EXISTS areas (
-    code TEXT PRIMARY KEY,
-    name TEXT NOT NULL,
-    map_top INTEGER,
-    map_left INTEGER
-)
-""")
-
-# forecasts テーブル（天気予報データ）
-cur.execute("""
-CREATE TABLE IF NOT EXISTS forecasts (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    area_code TEXT,
-    forecast_date TEXT,
+
+
+# weather.db の形の版（PRAGMA user_version に記録する）
+#   1: report_datetime 列を追加して発表ごとに行を残す
+#   2: (地域, 日付, 発表時刻) を主キーにした WITHOUT ROWID 表 + 日付の索引 + WAL
+#   3: 全部の時系列を入れる forecast_reports / forecast_weather / forecast_pops / forecast_temps
+#   4: 常駐モード用の fetch_validators（ETag / Last-Modified）と refresh_state（前回・次回の実行）
+SCHEMA_VERSION = 4
+
+FORECASTS_SQL = """
+CREATE TABLE {name} (
+    area_code TEXT NOT NULL,
+    forecast_date TEXT NOT NULL,
     weather TEXT,
+    report_datetime TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (area_code, forecast_date, report_datetime),
     FOREIGN KEY (area_code) REFERENCES areas(code)
-)
-""")
+) WITHOUT ROWID
+"""
+
+# 画面に出すのは各日付の一番新しい発表（SQLite では MAX と一緒に選んだ列はその行の値になる）
+LATEST_VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS latest_forecasts AS
+    SELECT area_code, forecast_date, weather, MAX(report_datetime) AS report_datetime
+    FROM forecasts
+    GROUP BY area_code, forecast_date
+"""
+
+# 常駐モード（--daemon）が覚えておくもの
+REFRESH_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS fetch_validators (
+    endpoint TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    changed_at TEXT                    -- 最後に新しい JSON を取り込んだ時刻
+);
+CREATE TABLE IF NOT EXISTS refresh_state (
+    key TEXT PRIMARY KEY,              -- 'last_success' / 'next_run'
+    value TEXT
+);
+"""
+
+
+def connect_db(path=dbname):
+    """接続ごとの設定をした接続を返す（db_init と画面の両方から使う）"""
+    conn = sqlite3.connect(path, timeout=10)
+    # WAL なので commit ごとの fsync はいらない（電源断で最後の commit が消えることはあるが壊れはしない）
+    conn.execute("PRAGMA synchronous = NORMAL")
+    # ページキャッシュ 16MB（負の値は KiB 単位）
+    conn.execute("PRAGMA cache_size = -16000")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def create_tables(conn):
+    # areas テーブル（地域マスタ）
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS areas (
+        code TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        map_top INTEGER,
+        map_left INTEGER
+    )
+    """)
+    conn.commit()
+
+    # forecasts テーブル（天気予報データ）
+    # 発表ごと（report_datetime）に行を残すので、過去の予報もたどれる
+    migrate_forecasts(conn)
+
+
+def migrate_forecasts(conn):
+    """forecasts を今の形にする（古い weather.db は作り直す。何度実行してもよい）
+
+    主キー (area_code, forecast_date, report_datetime) の WITHOUT ROWID 表にするので、
+    画面の「地域で絞って日付順」は主キーの B-tree をそのまま読むだけになる（カバリング索引と同じ）。
+    AUTOINCREMENT の id と sqlite_sequence の更新もなくなる。
+    """
+    # WAL にすると、db_init が書いている間も画面から読める（ファイルに記録されるので1回でよい）
+    conn.execute("PRAGMA journal_mode = WAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION: return
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'forecasts'").fetchone()
+
+    conn.execute("BEGIN")
+    try:
+        if not exists:
+            conn.execute(FORECASTS_SQL.format(name="forecasts"))
+        elif version < 2:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(forecasts)")]
+            # 発表時刻の分からない以前の行は '' にする。同じ (地域, 日付) が何行もあれば最後に入れた行を残す
+            report = "COALESCE(report_datetime, '')" if "report_datetime" in columns else "''"
+            order = "ORDER BY id" if "id" in columns else ""
+            conn.execute(FORECASTS_SQL.format(name="forecasts_new"))
+            conn.execute(f"""
+                INSERT OR REPLACE INTO forecasts_new (area_code, forecast_date, weather, report_datetime)
+                SELECT area_code, forecast_date, weather, {report} FROM forecasts
+                WHERE area_code IS NOT NULL AND forecast_date IS NOT NULL {order}
+            """)
+            conn.execute("DROP VIEW IF EXISTS latest_forecasts")
+            conn.execute("DROP TABLE forecasts")
+            conn.execute("ALTER TABLE forecasts_new RENAME TO forecasts")
+        # 日付の一覧（SELECT DISTINCT forecast_date）用
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_forecasts_date ON forecasts (forecast_date)")
+        conn.execute(LATEST_VIEW_SQL)
+        # 降水確率・気温・週間予報など、forecasts に入れていない分（jma_forecast.py）
+        for statement in (DETAIL_TABLES_SQL + REFRESH_TABLES_SQL).split(";"):
+            if statement.strip(): conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    # 作り直したので統計を取り直す
+    conn.execute("ANALYZE")
+    conn.commit()
 
 # ---------------------------------------------------------
 # 2. 地域データの登録 (MAP_POSITIONS)
@@ -97,111 +196,391 @@ MAP_POSITIONS = {
     "474000": {"top": 286, "left": 221, "name": "八重山"},
 }
 
-try:
-    # 地域データを登録 (INSERT OR REPLACE)
-    data_to_insert = []
-    for code, info in MAP_POSITIONS.items():
-        data_to_insert.append((code, info["name"], info["top"], info["left"]))
 
-    cur.executemany("""
-        INSERT OR REPLACE INTO areas (code, name, map_top, map_left)
-        VALUES (?, ?, ?, ?)
-    """, data_to_insert)
-    conn.commit()
-    print("✅ areasテーブルの準備完了！")
+def register_areas(conn):
+    try:
+        # 地域データを登録 (INSERT OR REPLACE)
+        data_to_insert = []
+        for code, info in MAP_POSITIONS.items():
+            data_to_insert.append((code, info["name"], info["top"], info["left"]))
+
+        conn.executemany("""
+            INSERT OR REPLACE INTO areas (code, name, map_top, map_left)
+            VALUES (?, ?, ?, ?)
+        """, data_to_insert)
+        conn.commit()
+        print("✅ areasテーブルの準備完了！")
 
-except Exception as e:
-    print(f"エリア登録エラー: {e}")
+    except Exception as e:
+        print(f"エリア登録エラー: {e}")
 
 
 # ---------------------------------------------------------
-# 3. APIから天気データを取得して保存する (ここから追加部分！)
+# 3. APIから天気データを取得して保存する
 # ---------------------------------------------------------
 
-# 古い予報データは一旦削除（リセット）
-cur.execute("DELETE FROM forecasts")
-conn.commit()
-
 # 一部の地域コードはAPIのエンドポイントが違うのでリダイレクト設定
 REDIRECT_MAP = {"014030": "014100", "460040": "460100"}
 
-def get_forecast_from_jma(area_code):
-    """気象庁APIからデータを取得して整形する関数"""
-    
-    # リダイレクトが必要ならコードを書き換える
-    target_code = REDIRECT_MAP.get(area_code, area_code)
-    
-    url = f"https://www.jma.go.jp/bosai/forecast/data/forecast/{target_code}.json"
+FORECAST_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/{code}.json"
+
+# 取り直してよいエラー（混雑・一時的な障害）
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 取り直してよい例外（接続が切れた・途中で途切れた・圧縮が壊れていた）
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError)
+
+# 条件付き GET で 304 が返ってきたとき
+NOT_MODIFIED = "not modified"
+
+
+class RateLimiter:
+    """全スレッド合わせて1秒あたり rate 回までにする（サーバー負荷軽減のため）"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def get_with_retry(url, session, limiter, retries=3, timeout=3, backoff=0.5, headers=None):
+    """URL を GET する。混雑やタイムアウトは backoff 秒から倍々に待って取り直す。
+    取り直さないレスポンス（200・304・404 など）を返す。取れなければ None"""
+    for attempt in range(retries + 1):
+        limiter.wait()
+        retry_after = None
+        try:
+            res = session.get(url, timeout=timeout, headers=headers)
+            if res.status_code not in RETRY_STATUS:
+                return res
+            retry_after = res.headers.get("Retry-After")
+        except RETRY_ERRORS:
+            pass
+        except requests.RequestException:
+            return None  # リダイレクトのループなど、取り直しても変わらないもの
+        if attempt == retries:
+            break
+        delay = backoff * 2 ** attempt * (1 + random.random())
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        time.sleep(delay)
+    return None
+
+
+def fetch_json(url, session, limiter, retries=3, timeout=3, backoff=0.5):
+    """URL の JSON を取る。取れなければ None"""
+    res = get_with_retry(url, session, limiter, retries, timeout, backoff)
+    if res is None or res.status_code != 200: return None
+    try:
+        return res.json()
+    except ValueError:
+        return None  # JSON ではなかった
+
+
+def fetch_if_changed(url, session, limiter, validator, retries=3):
+    """前回の ETag / Last-Modified を付けた条件付き GET。
+    (JSON, 新しい (etag, last_modified)) を返す。変わっていなければ NOT_MODIFIED、取れなければ None"""
+    etag, last_modified = validator or (None, None)
+    headers = {}
+    if etag: headers["If-None-Match"] = etag
+    if last_modified: headers["If-Modified-Since"] = last_modified
+    res = get_with_retry(url, session, limiter, retries, headers=headers)
+    if res is None: return None
+    if res.status_code == 304: return NOT_MODIFIED
+    if res.status_code != 200: return None
     try:
-        res = requests.get(url, timeout=3)
-        if res.status_code != 200: return None
         data = res.json()
-    except:
+    except ValueError:
         return None
+    return data, (res.headers.get("ETag"), res.headers.get("Last-Modified"))
 
-    try:
-        report = data[0]
-        # 天気予報(weathers)が含まれているエリアを探す
-        ts_weather = None
-        for ts in report["timeSeries"]:
-            # 'weathers'キーがあるデータセットを探す
-            if "areas" in ts and ts["areas"] and "weathers" in ts["areas"][0]:
-                ts_weather = ts
-                break
-        
-        if not ts_weather: return None
-
-        dates = ts_weather["timeDefines"]
-        weather_area = ts_weather["areas"][0] # 簡易的にリストの先頭の地域を使う
-        weathers = weather_area["weathers"]
-        
-        # (日付, 天気) のリストを作成
-        results = []
-        for i in range(len(weathers)):
-            if i >= len(dates): break
-            
-            # 日付の変換 (ISO形式 -> YYYY-MM-DD)
-            dt = datetime.datetime.fromisoformat(dates[i].replace("Z", "+00:00"))
-            date_str = dt.strftime("%Y-%m-%d")
-            
-            # 天気の全角スペースを半角に
-            weather_text = weathers[i].replace("　", " ")
-            
-            results.append((date_str, weather_text))
-            
-        return results
 
-    except Exception as e:
-        print(f"解析エラー({area_code}): {e}")
+def parse_forecast(data, endpoint):
+    """予報の JSON を1回だけなめて、全部の時系列・地域の行と、forecasts 用の地域ごとの天気を作る
+    (行のリスト, {"report_datetime": 発表時刻, "series": {細分区域コード: [(日付, 天気), ...]}})。
+    解析できなければ None"""
+    try:
+        rows = list(forecast_rows(data, endpoint))
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        print(f"解析エラー({endpoint}): {e}")
         return None
+    return rows, short_series(rows)
+
+
+def pick_series(document, area_code):
+    """(発表時刻, [(日付, 天気), ...])。その地域の細分区域があればそれを、なければ先頭の地域を使う
+    （014030 十勝は 014100 の JSON の中に「十勝地方」として入っている）"""
+    if not document or not document["series"]: return None
+    series = document["series"]
+    return document["report_datetime"], series.get(area_code) or next(iter(series.values()))
+
+
+def plan_fetches(area_codes):
+    """実際に取りに行くエンドポイントごとに地域をまとめる {エンドポイントのコード: [地域コード, ...]}"""
+    plan = {}
+    for code in area_codes:
+        # リダイレクトが必要ならコードを書き換える
+        plan.setdefault(REDIRECT_MAP.get(code, code), []).append(code)
+    return plan
+
+
+def get_forecast_from_jma(area_code, session=requests, limiter=None, retries=3):
+    """気象庁APIからデータを取得して整形する関数（1地域だけ取るとき）"""
+    target_code = REDIRECT_MAP.get(area_code, area_code)
+    data = fetch_json(FORECAST_URL.format(code=target_code), session, limiter or RateLimiter(0), retries)
+    if data is None: return None
+    parsed = parse_forecast(data, target_code)
+    return pick_series(parsed[1], area_code) if parsed else None
+
+
+def fetch_all(area_codes, workers=8, rate=10.0, retries=3, validators=None, on_rows=None):
+    """全エリアの予報を並行して取る。
+    ({エリアコード: (発表時刻, [(日付, 天気), ...]) or None},
+     {"requested": 取得したエンドポイント数, "not_modified": 変わっていなかった数,
+      "reports": {取り込んだエンドポイント: 最新の発表時刻}})
+
+    同じエンドポイントを使う地域（REDIRECT_MAP）はまとめて1回だけ取得・解析して、
+    それぞれの地域に細分区域の予報を配る。
+    on_rows(エンドポイント, 全部の行) を渡すと、取り終えた順にこのスレッドで呼んでから行を手放す
+    （メモリに載るのは、取得・解析中の JSON とその行だけ）。
+    validators（{エンドポイント: (etag, last_modified)}）を渡すと条件付き GET にする。
+    変わっていなかったエンドポイントの地域は None になり、取り込んだエンドポイントの分は新しい値で書き換える。
+    """
+    plan = plan_fetches(area_codes)
+    limiter = RateLimiter(rate)
+    # 接続を使い回す（スレッドごとに1本ずつ、プールの上限は workers 本）
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    not_modified = set()
+
+    def fetch_endpoint(endpoint):
+        url = FORECAST_URL.format(code=endpoint)
+        if validators is None:
+            data = fetch_json(url, session, limiter, retries)
+            return None if data is None else parse_forecast(data, endpoint)
+        fetched = fetch_if_changed(url, session, limiter, validators.get(endpoint), retries)
+        if fetched == NOT_MODIFIED:
+            not_modified.add(endpoint)
+            return None
+        if fetched is None: return None
+        data, validator = fetched
+        parsed = parse_forecast(data, endpoint)
+        # 解析できたものだけ覚える（できなかったものは次も取り直す）
+        if parsed: validators[endpoint] = validator
+        return parsed
+
+    results, reports = {}, {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            futures = {pool.submit(fetch_endpoint, endpoint): endpoint for endpoint in plan}
+            for future in as_completed(futures):
+                endpoint = futures.pop(future)
+                parsed = future.result()
+                for code in plan[endpoint]:
+                    results[code] = pick_series(parsed and parsed[1], code)
+                if parsed is None: continue
+                rows = parsed[0]
+                report_datetime = max((row[3] for table, row in rows if table == "report"), default=None)
+                if report_datetime: reports[endpoint] = report_datetime
+                if on_rows: on_rows(endpoint, rows)
+    finally:
+        session.close()
+    stats = {"requested": len(plan), "not_modified": len(not_modified), "reports": reports}
+    return {code: results[code] for code in area_codes}, stats
+
+
+def save_details(conn, rows):
+    """fetch_all の on_rows 用。1エンドポイント分の全部の行を、降水確率・気温・週間予報の表に書く"""
+    with conn:
+        return write_rows(conn, rows)
+
+
+def save_forecasts(conn, results):
+    """予報を (地域, 日付, 発表時刻) ごとにまとめて upsert する。({地域: 書いた行数}, 変化のなかった地域数)
+
+    前回と同じ発表（report_datetime が保存済みの最新と同じ）の地域は何も書かない。
+    古い発表の行は消さずに残すので、過去の予報のアーカイブになる。
+    1つのトランザクションなので、途中で失敗しても読む側には前回の状態が見える。
+    """
+    latest = dict(conn.execute("SELECT area_code, MAX(report_datetime) FROM forecasts GROUP BY area_code"))
+    rows, written, unchanged = [], {}, 0
+    for code, result in results.items():
+        if not result: continue
+        report_datetime, forecasts = result
+        if latest.get(code) == report_datetime:
+            unchanged += 1
+            continue
+        written[code] = len(forecasts)
+        rows.extend((code, f_date, f_weather, report_datetime) for f_date, f_weather in forecasts)
+    if rows:
+        with conn:
+            conn.executemany("""
+                INSERT INTO forecasts (area_code, forecast_date, weather, report_datetime)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (area_code, forecast_date, report_datetime)
+                DO UPDATE SET weather = excluded.weather WHERE weather IS NOT excluded.weather
+            """, rows)
+    return written, unchanged
+
+
+# ---------------------------------------------------------
+# 4. 常駐モード（気象庁の定時発表に合わせて取り込む）
+# ---------------------------------------------------------
+
+# 日本時間（夏時間はないので固定の +9 時間でよい）
+JST = datetime.timezone(datetime.timedelta(hours=9), "JST")
+
+# 府県天気予報の定時発表（週間予報は 11時・17時。どちらも同じ JSON に入っている）
+PUBLISH_HOURS = (5, 11, 17)
+
+
+def next_publish_time(now):
+    """now より後の、次の定時発表の時刻"""
+    now = now.astimezone(JST)
+    for days in (0, 1):
+        day = now.date() + datetime.timedelta(days=days)
+        for hour in PUBLISH_HOURS:
+            publish = datetime.datetime.combine(day, datetime.time(hour), JST)
+            if publish > now:
+                return publish
+
+
+def load_validators(conn):
+    """{エンドポイント: (etag, last_modified)}"""
+    return {endpoint: (etag, last_modified)
+            for endpoint, etag, last_modified in conn.execute("SELECT endpoint, etag, last_modified FROM fetch_validators")}
+
+
+def set_refresh_state(conn, **values):
+    with conn:
+        conn.executemany("INSERT INTO refresh_state (key, value) VALUES (?, ?)"
+                         " ON CONFLICT (key) DO UPDATE SET value = excluded.value", values.items())
+
+
+def refresh(conn, area_codes, args):
+    """条件付き GET で変わったエンドポイントだけ取り込む。
+    ({取り込んだエンドポイント: 発表時刻}, 変わっていなかった数, 取れなかった数)"""
+    validators = load_validators(conn)
+    results, stats = fetch_all(area_codes, args.workers, args.rate, args.retries, validators,
+                               on_rows=lambda endpoint, rows: save_details(conn, rows))
+    written, _ = save_forecasts(conn, results)
+    reports = stats["reports"]
+    # 保存できてから ETag を覚える（途中で落ちても、次は取り直すだけ）
+    now = datetime.datetime.now(JST).isoformat(timespec="seconds")
+    with conn:
+        conn.executemany("""
+            INSERT INTO fetch_validators (endpoint, etag, last_modified, changed_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (endpoint) DO UPDATE SET
+                etag = excluded.etag, last_modified = excluded.last_modified, changed_at = excluded.changed_at
+        """, [(endpoint, *validators[endpoint], now) for endpoint in reports])
+    failed = stats["requested"] - stats["not_modified"] - len(reports)
+    print(f"[{now}] 取り込み {len(reports)}件（{sum(written.values())}行）, 変化なし {stats['not_modified']}件"
+          + (f", ⚠️ 失敗 {failed}件" if failed else ""), flush=True)
+    if not failed:
+        set_refresh_state(conn, last_success=now)
+    return reports, stats["not_modified"], failed
+
+
+def try_refresh(conn, area_codes, args):
+    """refresh() の {取り込んだエンドポイント: 発表時刻}。DB が使えない（画面側が migrate 中など）ときは {}"""
+    try:
+        return refresh(conn, area_codes, args)[0]
+    except (sqlite3.Error, requests.RequestException) as e:
+        print(f"⚠️ 取り込みに失敗しました（次の問い合わせで取り直します）: {e}", flush=True)
+        return {}
+
+
+def run_daemon(conn, area_codes, args, stop_event=None):
+    """定時発表（05/11/17時）ごとに起きて、全部のエンドポイントが新しい発表になるまで
+    poll_interval 秒おきに条件付き GET をくり返す（window 分たっても来なければ次の発表まで待つ）。
+
+    1回目は全部のエンドポイントに聞くが、304 は本文がないので軽い。
+    2回目からは、まだ新しい発表になっていないエンドポイントにだけ聞く。
+    """
+    stop_event = stop_event or threading.Event()
+    plan = plan_fetches(area_codes)
+    # 起動したときに、止まっていた間の発表を取り込んでおく
+    try_refresh(conn, area_codes, args)
+    while not stop_event.is_set():
+        publish = next_publish_time(datetime.datetime.now(JST))
+        set_refresh_state(conn, next_run=publish.isoformat(timespec="seconds"))
+        print(f"💤 次の取得: {publish:%m/%d %H:%M}", flush=True)
+        if stop_event.wait((publish - datetime.datetime.now(JST)).total_seconds()): break
+
+        deadline = publish + datetime.timedelta(minutes=args.window)
+        pending = set(plan)
+        while pending:
+            codes = [code for endpoint in plan if endpoint in pending for code in plan[endpoint]]
+            reports = try_refresh(conn, codes, args)
+            pending -= {endpoint for endpoint, report_datetime in reports.items()
+                        if datetime.datetime.fromisoformat(report_datetime) >= publish}
+            retry_at = datetime.datetime.now(JST) + datetime.timedelta(seconds=args.poll_interval)
+            if not pending or retry_at > deadline: break
+            set_refresh_state(conn, next_run=retry_at.isoformat(timespec="seconds"))
+            if stop_event.wait(args.poll_interval): return
+        if pending:
+            print(f"⚠️ {publish:%H}時の発表が {len(pending)}件来ていません: {', '.join(sorted(pending))}", flush=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="気象庁の天気予報を取得して weather.db に保存する")
+    ap.add_argument("--workers", type=int, default=8, help="同時に取得するエリアの数（1 なら1件ずつ）")
+    ap.add_argument("--rate", type=float, default=10.0, help="全体で1秒あたりに送るリクエストの上限")
+    ap.add_argument("--retries", type=int, default=3, help="混雑・タイムアウトのときに取り直す回数")
+    ap.add_argument("--daemon", action="store_true", help="常駐して、定時発表（05/11/17時）ごとに変わった分だけ取り込む")
+    ap.add_argument("--poll-interval", type=float, default=120, help="常駐モードで、発表待ちの間に問い合わせる間隔（秒）")
+    ap.add_argument("--window", type=float, default=60, help="常駐モードで、発表時刻から何分まで待つか")
+    args = ap.parse_args()
+
+    conn = connect_db(dbname)
+    create_tables(conn)
+    register_areas(conn)
+
+    if args.daemon:
+        area_codes = [code for code, in conn.execute("SELECT code FROM areas")]
+        print("🚀 常駐モードで開始します（Ctrl+C で終了）")
+        try:
+            run_daemon(conn, area_codes, args)
+        except KeyboardInterrupt:
+            print("\n終了します")
+        finally:
+            conn.close()
+        return
+
+    print("🚀 天気データの取得を開始します...")
+    start = time.perf_counter()
+
+    # DBに登録した全エリアに対してAPIを実行
+    all_areas = conn.execute("SELECT code, name FROM areas").fetchall()
+    # 降水確率・気温・週間予報の行は、エンドポイントを取り終えるたびに書く
+    results, stats = fetch_all([code for code, _ in all_areas], args.workers, args.rate, args.retries,
+                               on_rows=lambda endpoint, rows: save_details(conn, rows))
+    requested = stats["requested"]
+    print(f"📡 取得した予報 {requested}件（同じエンドポイントの地域をまとめて {len(results) - requested}件節約）")
+
+    for code, name in all_areas:
+        print(f"{name}({code}): {'OK!' if results[code] else '失敗 (データなし)'}")
+
+    # 取得できたデータをforecastsテーブルに保存（前回と同じ発表の地域は書かない）
+    written, unchanged = save_forecasts(conn, results)
+    conn.close()
+
+    ok = sum(1 for f in results.values() if f)
+    print(f"\n🎉 全て完了しました！ {ok}/{len(results)}エリアを取得"
+          f"（新しい発表 {len(written)}エリア・{sum(written.values())}件を保存, 変化なし {unchanged}エリア）"
+          f" {time.perf_counter() - start:.1f}秒")
+
 
-print("🚀 天気データの取得を開始します...")
-
-# DBに登録した全エリアに対してAPIを実行
-cur.execute("SELECT code, name FROM areas")
-all_areas = cur.fetchall()
-
-for code, name in all_areas:
-    
-    
-    forecasts = get_forecast_from_jma(code)
-    
-    if forecasts:
-        # 取得できたデータをforecastsテーブルに保存
-        for f_date, f_weather in forecasts:
-            cur.execute("""
-                INSERT INTO forecasts (area_code, forecast_date, weather)
-                VALUES (?, ?, ?)
-            """, (code, f_date, f_weather))
-        print(" OK!")
-    else:
-        print(" 失敗 (データなし)")
-    
-    # サーバー負荷軽減のため少し待つ
-    time.sleep(0.5)
-
-# 最後に変更を確定して閉じる
-conn.commit()
-conn.close()
-
-print("\n🎉 全て完了しました！ weather.db にデータが入りました。")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
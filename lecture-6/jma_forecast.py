@@ -0,0 +1,190 @@
+"""気象庁の予報 JSON（forecast/{code}.json）を、全部の時系列・全部の地域について行に分解する
+
+1つの JSON には2つの発表が入っている。
+  [0] 3日分の予報（短期）: 天気・風・波 / 6時間ごとの降水確率 / 朝の最低・日中の最高気温
+  [1] 7日分の予報（週間）: 天気・降水確率・信頼度 / 最低・最高気温とその幅
+どちらも timeSeries ごとに timeDefines（時刻）と areas（細分区域やアメダス地点）の配列を持つ。
+
+日付は YYYYMMDD、時刻は YYYYMMDDHH の整数で持つ（文字列より小さく、範囲の比較も速い）。
+"""
+
+DETAIL_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS forecast_reports (
+    report_id INTEGER PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    kind TEXT NOT NULL,                -- 'short'（3日） / 'weekly'（7日）
+    publishing_office TEXT,
+    report_datetime TEXT NOT NULL,
+    UNIQUE (endpoint, kind, report_datetime)
+);
+CREATE TABLE IF NOT EXISTS forecast_areas (
+    code TEXT PRIMARY KEY,             -- 細分区域・府県・アメダス地点のコード
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS forecast_weather (
+    report_id INTEGER NOT NULL REFERENCES forecast_reports(report_id),
+    area_code TEXT NOT NULL,
+    date_key INTEGER NOT NULL,
+    weather_code INTEGER,
+    weather TEXT,
+    wind TEXT,
+    wave TEXT,
+    reliability TEXT,
+    PRIMARY KEY (report_id, area_code, date_key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS forecast_pops (
+    report_id INTEGER NOT NULL REFERENCES forecast_reports(report_id),
+    area_code TEXT NOT NULL,
+    time_key INTEGER NOT NULL,
+    pop INTEGER,
+    PRIMARY KEY (report_id, area_code, time_key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS forecast_temps (
+    report_id INTEGER NOT NULL REFERENCES forecast_reports(report_id),
+    area_code TEXT NOT NULL,
+    date_key INTEGER NOT NULL,
+    temp_min REAL,
+    temp_max REAL,
+    temp_min_lower REAL,
+    temp_min_upper REAL,
+    temp_max_lower REAL,
+    temp_max_upper REAL,
+    PRIMARY KEY (report_id, area_code, date_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_forecast_weather_area ON forecast_weather (area_code, date_key);
+CREATE INDEX IF NOT EXISTS idx_forecast_temps_area ON forecast_temps (area_code, date_key);
+"""
+
+KINDS = ["short", "weekly"]
+
+INSERT_SQL = {
+    "weather": "INSERT OR REPLACE INTO forecast_weather VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+    "pop": "INSERT OR REPLACE INTO forecast_pops VALUES (?, ?, ?, ?)",
+    "temp": "INSERT OR REPLACE INTO forecast_temps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+}
+
+
+def time_key(iso):
+    """'2026-10-18T05:00:00+09:00'（日本時間）→ 2026101805"""
+    return int(iso[0:4] + iso[5:7] + iso[8:10] + iso[11:13])
+
+
+def _int(value):
+    return int(value) if value not in (None, "") else None
+
+
+def _float(value):
+    return float(value) if value not in (None, "") else None
+
+
+def _at(values, i):
+    return values[i] if values is not None and i < len(values) else None
+
+
+def forecast_rows(data, endpoint):
+    """JSON を1回なめて、行を出てきた順に返すジェネレーター
+
+    ("report", (endpoint, kind, 発表官署, 発表時刻))  … 以降の行はこの発表のもの
+    ("area", (コード, 名前))
+    ("weather", (地域, 日付, 天気コード, 天気, 風, 波, 信頼度))
+    ("pop", (地域, 時刻, 降水確率))
+    ("temp", (地域, 日付, 最低, 最高, 最低の下限, 最低の上限, 最高の下限, 最高の上限))
+    """
+    for index, report in enumerate(data):
+        kind = KINDS[index] if index < len(KINDS) else f"report{index}"
+        report_datetime = report["reportDatetime"]
+        yield "report", (endpoint, kind, report.get("publishingOffice"), report_datetime)
+        report_date, report_hour = divmod(time_key(report_datetime), 100)
+
+        for ts in report["timeSeries"]:
+            keys = [time_key(t) for t in ts["timeDefines"]]
+            for area in ts["areas"]:
+                code = area["area"]["code"]
+                yield "area", (code, area["area"]["name"])
+
+                if "weatherCodes" in area:
+                    codes, weathers = area["weatherCodes"], area.get("weathers")
+                    winds, waves, reliabilities = area.get("winds"), area.get("waves"), area.get("reliabilities")
+                    for i, key in enumerate(keys):
+                        weather = _at(weathers, i)
+                        yield "weather", (code, key // 100, _int(_at(codes, i)),
+                                          weather.replace("　", " ") if weather else None,
+                                          _at(winds, i), _at(waves, i), _at(reliabilities, i) or None)
+
+                if "pops" in area:
+                    pops = area["pops"]
+                    for i, key in enumerate(keys):
+                        yield "pop", (code, key, _int(_at(pops, i)))
+
+                if "temps" in area:
+                    # 短期の気温: 0時の値が朝の最低、9時の値が日中の最高。
+                    # 朝の最低を過ぎてから出た発表では、当日の0時の欄にも最高気温が入っているので使わない
+                    temps = area["temps"]
+                    by_date = {}
+                    for i, key in enumerate(keys):
+                        date, hour = divmod(key, 100)
+                        slot = by_date.setdefault(date, [None, None])
+                        if hour < 9:
+                            if not (date == report_date and report_hour >= 9):
+                                slot[0] = _float(_at(temps, i))
+                        else:
+                            slot[1] = _float(_at(temps, i))
+                    for date, (t_min, t_max) in by_date.items():
+                        yield "temp", (code, date, t_min, t_max, None, None, None, None)
+
+                if "tempsMin" in area:
+                    for i, key in enumerate(keys):
+                        yield "temp", (code, key // 100,
+                                       _float(_at(area["tempsMin"], i)), _float(_at(area.get("tempsMax"), i)),
+                                       _float(_at(area.get("tempsMinLower"), i)), _float(_at(area.get("tempsMinUpper"), i)),
+                                       _float(_at(area.get("tempsMaxLower"), i)), _float(_at(area.get("tempsMaxUpper"), i)))
+
+
+def short_series(rows):
+    """forecast_rows の行から、短期の天気を地域ごとにまとめる（forecasts 用）
+    {"report_datetime": 発表時刻, "series": {細分区域: [(YYYY-MM-DD, 天気), ...]}}。天気がなければ None"""
+    series, report_datetime, short_datetime, kind = {}, None, None, None
+    for table, row in rows:
+        if table == "report":
+            _, kind, _, report_datetime = row
+        elif table == "weather" and kind == "short" and row[3] is not None:
+            short_datetime = report_datetime
+            date = str(row[1])
+            series.setdefault(row[0], []).append((f"{date[:4]}-{date[4:6]}-{date[6:]}", row[3]))
+    if not series: return None
+    return {"report_datetime": short_datetime, "series": series}
+
+
+def write_rows(conn, rows):
+    """forecast_rows の行を書く（呼び出し側のトランザクションの中で使う）。(書いた発表数, 同じ発表で飛ばした数)
+
+    (endpoint, 種類, 発表時刻) が保存済みの発表は、その発表の行をまるごと飛ばす。
+    """
+    written = skipped = 0
+    report_id = None
+    pending = {table: [] for table in INSERT_SQL}
+    areas = {}
+
+    def flush():
+        for table, batch in pending.items():
+            if batch:
+                conn.executemany(INSERT_SQL[table], batch)
+                batch.clear()
+
+    for table, row in rows:
+        if table == "report":
+            flush()
+            cur = conn.execute("INSERT OR IGNORE INTO forecast_reports"
+                               " (endpoint, kind, publishing_office, report_datetime) VALUES (?, ?, ?, ?)", row)
+            report_id = cur.lastrowid if cur.rowcount else None
+            if report_id is None: skipped += 1
+            else: written += 1
+        elif table == "area":
+            areas[row[0]] = row[1]
+        elif report_id is not None:
+            pending[table].append((report_id, *row))
+    flush()
+    conn.executemany("INSERT INTO forecast_areas (code, name) VALUES (?, ?)"
+                     " ON CONFLICT (code) DO UPDATE SET name = excluded.name WHERE name IS NOT excluded.name",
+                     areas.items())
+    return written, skipped
@@ -1,8 +1,9 @@
 import flet as ft
-import sqlite3
 import datetime
 import os
 
+from db_init import connect_db, migrate_forecasts
+
 def main(page: ft.Page):
     page.title = "天気予報アプリ"
     page.theme_mode = ft.ThemeMode.LIGHT
@@ -25,7 +26,9 @@ def main(page: ft.Page):
     AVAILABLE_DATES = []
 
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_db(db_path)
+        # 古い weather.db でも latest_forecasts を読めるようにする
+        migrate_forecasts(conn)
         cur = conn.cursor()
         cur.execute("SELECT code, name, map_top, map_left FROM areas ORDER BY code")
         rows = cur.fetchall()
@@ -51,13 +54,13 @@ def main(page: ft.Page):
 
     def get_forecast_data(target_code, target_name, filter_date):
         try:
-            conn = sqlite3.connect(db_path)
+            conn = connect_db(db_path)
             cur = conn.cursor()
             if filter_date == "すべて" or filter_date is None:
-                sql = "SELECT forecast_date, weather FROM forecasts WHERE area_code = ? ORDER BY forecast_date"
+                sql = "SELECT forecast_date, weather FROM latest_forecasts WHERE area_code = ? ORDER BY forecast_date"
                 params = (target_code,)
             else:
-                sql = "SELECT forecast_date, weather FROM forecasts WHERE area_code = ? AND forecast_date = ?"
+                sql = "SELECT forecast_date, weather FROM latest_forecasts WHERE area_code = ? AND forecast_date = ?"
                 params = (target_code, filter_date)
             cur.execute(sql, params)
             rows = cur.fetchall()